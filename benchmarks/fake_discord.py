@@ -0,0 +1,215 @@
+import asyncio
+import itertools
+import time
+from collections import Counter
+from types import SimpleNamespace
+from typing import Any
+
+import discord
+
+
+_ids = itertools.count(10 ** 17)
+
+
+class FakeUser:
+    def __init__(self, name: str, *, bot: bool = False):
+        self.id = next(_ids)
+        self.name = name
+        self.bot = bot
+        self.mention = f"<@{self.id}>"
+        self.voice = None
+
+
+class FakeMessage:
+    def __init__(self, channel: "FakeTextChannel", content: str | None = None, embed: discord.Embed | None = None):
+        self.id = next(_ids)
+        self.channel = channel
+        self.content = content
+        self.embed = embed
+
+    async def edit(self, *, content: str | None = None, embed: discord.Embed | None = None):
+        self.channel.client.api_calls["edit"] += 1
+        self.content = content or self.content
+        self.embed = embed or self.embed
+        return self
+
+    async def delete(self):
+        self.channel.client.api_calls["delete"] += 1
+
+
+class FakeInteractionResponse:
+    def __init__(self):
+        self.done = False
+
+    def is_done(self) -> bool:
+        return self.done
+
+
+class FakeInteraction(FakeMessage):
+    """What ctx.respond gives back, the music cog only edits and deletes it."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.response = FakeInteractionResponse()
+
+    async def edit_original_response(self, **kwargs):
+        return await self.edit(**kwargs)
+
+    async def delete_original_response(self):
+        await self.delete()
+
+
+class FakeTextChannel:
+    def __init__(self, guild: "FakeGuild"):
+        self.id = next(_ids)
+        self.guild = guild
+        self.client = guild.client
+
+    async def send(self, content: str | None = None, *, embed: discord.Embed | None = None, **_):
+        self.client.api_calls["send"] += 1
+        return FakeMessage(self, content, embed)
+
+    async def delete_messages(self, messages: list[FakeMessage]):
+        self.client.api_calls["bulk_delete"] += 1
+
+    def permissions_for(self, member: FakeUser):
+        return SimpleNamespace(manage_messages=True)
+
+
+class FakeVoiceChannel(FakeTextChannel):
+    """Voice channels have a text chat too, the cog announces songs there on track end."""
+
+    def __init__(self, guild: "FakeGuild"):
+        super().__init__(guild)
+        self.members: list[FakeUser] = []
+
+    def _get_voice_client_key(self) -> tuple[int, str]:
+        return self.guild.id, "guild_id"
+
+    async def connect(self, *, cls, timeout: float = 60.0, reconnect: bool = True):
+        player = cls(self.guild.client, self)
+        self.guild.voice_client = player
+        await player.connect(timeout=timeout, reconnect=reconnect)
+        return player
+
+
+class FakeGuild:
+    """A guild whose gateway answers voice state changes straight away, the way Discord's eventually would."""
+
+    def __init__(self, client: "FakeBot", listeners: int = 3):
+        self.id = next(_ids)
+        self.client = client
+        self.shard_id = 0
+        self.me = client.user
+        self.voice_client = None
+
+        self.text_channel = FakeTextChannel(self)
+        self.voice_channel = FakeVoiceChannel(self)
+        self.members = [FakeUser(f"listener-{i}") for i in range(listeners)]
+        for member in self.members:
+            member.voice = SimpleNamespace(channel=self.voice_channel)
+            self.voice_channel.members.append(member)
+
+        client.channels[self.text_channel.id] = self.text_channel
+        client.channels[self.voice_channel.id] = self.voice_channel
+
+    async def change_voice_state(self, *, channel: FakeVoiceChannel | None, **_):
+        player = self.voice_client
+        if player is None:
+            return
+
+        if channel is None:
+            self.voice_client = None
+            await player.on_voice_state_update({"channel_id": None, "session_id": f"voice-{self.id}"})
+            return
+
+        await player.on_voice_state_update({"channel_id": str(channel.id), "session_id": f"voice-{self.id}"})
+        await player.on_voice_server_update({"token": "benchmark", "endpoint": "voice.invalid", "guild_id": str(self.id)})
+
+
+class FakeContext:
+    """Stands in for an ApplicationContext, with the attributes the music cog reads."""
+
+    def __init__(self, bot: "FakeBot", cog, guild: FakeGuild, author: FakeUser, command):
+        self.bot = bot
+        self.cog = cog
+        self.guild = guild
+        self.channel = guild.text_channel
+        self.author = author
+        self.command = command
+        self.interaction = FakeInteraction(self.channel, None, None)
+
+    @property
+    def voice_client(self):
+        return self.guild.voice_client
+
+    async def defer(self, **_):
+        self.bot.api_calls["defer"] += 1
+        self.interaction.response.done = True
+
+    async def respond(self, content: str | None = None, *, embed: discord.Embed | None = None, **_):
+        # Like ApplicationContext.respond, an interaction that was already answered or deferred gets a followup
+        if self.interaction.response.is_done():
+            self.bot.api_calls["followup"] += 1
+            return FakeMessage(self.channel, content, embed)
+
+        self.bot.api_calls["respond"] += 1
+        self.interaction.content, self.interaction.embed = content, embed
+        self.interaction.response.done = True
+        return self.interaction
+
+    async def invoke(self, command, **kwargs):
+        # Like ApplicationContext.invoke, this skips checks and hooks and calls the callback directly
+        return await command.callback(self.cog, self, **kwargs)
+
+
+class FakeBot:
+    """The slice of a py-cord Bot that cogs and wavelink touch: the loop, the user, channels and dispatch."""
+
+    def __init__(self):
+        self.loop = asyncio.get_running_loop()
+        self.user = FakeUser("benchmark-bot", bot=True)
+        self.channels: dict[int, Any] = {}
+        self.cogs: list = []
+        self.api_calls: Counter = Counter()
+        self._connection = SimpleNamespace(_remove_voice_client=lambda key: None)
+
+    def add_cog(self, cog):
+        self.cogs.append(cog)
+
+    def get_channel(self, channel_id: int):
+        return self.channels.get(channel_id)
+
+    async def wait_until_ready(self):
+        pass
+
+    def dispatch(self, event: str, *args: Any):
+        for cog in self.cogs:
+            for name, listener in cog.get_listeners():
+                if name == f"on_{event}":
+                    self.loop.create_task(listener(*args))
+
+
+async def invoke(bot: FakeBot, cog, command, guild: FakeGuild, author: FakeUser, **kwargs) -> float:
+    """Runs a slash command the way py-cord would, hooks included, and returns how long it took."""
+    ctx = FakeContext(bot, cog, guild, author, command)
+    start = time.perf_counter()
+
+    try:
+        if command._before_invoke:
+            await command._before_invoke(cog, ctx)
+        await cog.cog_before_invoke(ctx)
+    except Exception as e:
+        # A failing before hook skips the command and the after hooks, but still reaches the error handler
+        await cog.cog_command_error(ctx, e)
+        raise
+
+    try:
+        await command.callback(cog, ctx, **kwargs)
+    except Exception as e:
+        await cog.cog_command_error(ctx, e)
+        raise
+    finally:
+        await cog.cog_after_invoke(ctx)
+
+    return time.perf_counter() - start
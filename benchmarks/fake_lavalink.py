@@ -0,0 +1,186 @@
+import asyncio
+import base64
+import hashlib
+import json
+import time
+from collections import Counter
+from typing import Any
+from urllib.parse import parse_qs, urlsplit
+
+from aiohttp import web
+
+
+class FakeLavalink:
+    """Just enough of the Lavalink v3 REST and websocket API for wavelink, served from track payload files.
+
+    Searches, links and playlists all resolve to variations of the given payloads, tracks "play" for
+    `track_seconds` and then end with the same websocket events a real node would send.
+    """
+
+    def __init__(self, tracks: list[dict[str, Any]], *, latency: float = 0.0, track_seconds: float = 20.0, playlist_size: int = 100):
+        self.tracks = tracks
+        self.latency = latency
+        self.track_seconds = track_seconds
+        self.playlist_size = playlist_size
+
+        self.requests: Counter = Counter()
+        self._decoded: dict[str, dict[str, Any]] = {track["encoded"]: track for track in tracks}
+        self._playing: dict[str, tuple[str, asyncio.TimerHandle]] = {}
+        self._sockets: list[web.WebSocketResponse] = []
+        self._runner: web.AppRunner | None = None
+        self.port: int | None = None
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        app = web.Application(middlewares=[self._count])
+        app.add_routes([
+            web.get("/", self._websocket),
+            web.get("/v3/websocket", self._websocket),
+            web.get("/version", self._version),
+            web.get("/v3/loadtracks", self._load_tracks),
+            web.get("/v3/decodetrack", self._decode_track),
+            web.get("/v3/stats", self._stats),
+            web.patch("/v3/sessions/{session}/players/{guild}", self._update_player),
+            web.delete("/v3/sessions/{session}/players/{guild}", self._destroy_player),
+        ])
+
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+
+        self.port = site._server.sockets[0].getsockname()[1]
+        return f"http://{host}:{self.port}"
+
+    async def close(self):
+        for _, timer in self._playing.values():
+            timer.cancel()
+        for socket in self._sockets:
+            await socket.close()
+        if self._runner:
+            await self._runner.cleanup()
+
+    def track(self, seed: str, video_id: str | None = None) -> dict[str, Any]:
+        """A unique track for the seed, built from one of the payloads so it looks like the real thing.
+
+        Linked tracks keep the link's video ID, the rest get a made up one of the same 11 characters.
+        """
+        digest = hashlib.sha1(seed.encode()).digest()
+        base = self.tracks[int.from_bytes(digest, "big") % len(self.tracks)]
+
+        info = {**base["info"], "identifier": video_id or base64.urlsafe_b64encode(digest).decode()[:11]}
+        info["uri"] = f"https://www.youtube.com/watch?v={info['identifier']}"
+        encoded = base64.b64encode(json.dumps(info, separators=(",", ":")).encode()).decode()
+
+        track = {"encoded": encoded, "info": info}
+        self._decoded[encoded] = track
+        return track
+
+    @web.middleware
+    async def _count(self, request: web.Request, handler):
+        self.requests[request.match_info.route.resource.canonical if request.match_info.route.resource else request.path] += 1
+        if self.latency and request.path != "/version":
+            await asyncio.sleep(self.latency)
+        return await handler(request)
+
+    async def _websocket(self, request: web.Request):
+        socket = web.WebSocketResponse()
+        await socket.prepare(request)
+        self._sockets.append(socket)
+
+        await socket.send_json({"op": "ready", "resumed": False, "sessionId": "benchmark"})
+        async for _ in socket:
+            pass
+
+        self._sockets.remove(socket)
+        return socket
+
+    async def _version(self, request: web.Request):
+        return web.Response(text="3.7.8")
+
+    async def _load_tracks(self, request: web.Request):
+        identifier = request.query["identifier"]
+
+        if "list=" in identifier:
+            return web.json_response({
+                "loadType": "PLAYLIST_LOADED",
+                "playlistInfo": {"name": f"Playlist {identifier[-8:]}", "selectedTrack": -1},
+                "tracks": [self.track(f"{identifier}#{i}") for i in range(self.playlist_size)],
+            })
+
+        if identifier.startswith("ytsearch:"):
+            return web.json_response({
+                "loadType": "SEARCH_RESULT",
+                "playlistInfo": {},
+                "tracks": [self.track(f"{identifier}#{i}") for i in range(5)],
+            })
+
+        video_id = parse_qs(urlsplit(identifier).query).get("v", [identifier])[0]
+        return web.json_response({"loadType": "TRACK_LOADED", "playlistInfo": {}, "tracks": [self.track(identifier, video_id)]})
+
+    async def _decode_track(self, request: web.Request):
+        track = self._decoded.get(request.query["encodedTrack"])
+        if track is None:
+            return web.json_response({"error": "Unknown track"}, status=400)
+
+        return web.json_response(track)
+
+    async def _stats(self, request: web.Request):
+        return web.json_response(self._stats_payload())
+
+    async def _update_player(self, request: web.Request):
+        guild_id = request.match_info["guild"]
+        data = await request.json()
+
+        if "encodedTrack" in data:
+            if data["encodedTrack"] is None:
+                self._end(guild_id, "STOPPED")
+            elif not (request.query.get("noReplace") == "True" and guild_id in self._playing):
+                self._end(guild_id, "REPLACED")
+                self._start(guild_id, data["encodedTrack"])
+        elif "position" in data and guild_id in self._playing:
+            length = self._decoded[self._playing[guild_id][0]]["info"]["length"]
+            if data["position"] >= length:
+                self._end(guild_id, "FINISHED")
+
+        current = self._playing.get(guild_id)
+        return web.json_response({
+            "guildId": guild_id,
+            "track": self._decoded[current[0]] if current else None,
+            "volume": data.get("volume", 100),
+            "paused": data.get("paused", False),
+            "voice": data.get("voice", {}),
+            "filters": data.get("filters", {}),
+        })
+
+    async def _destroy_player(self, request: web.Request):
+        if entry := self._playing.pop(request.match_info["guild"], None):
+            entry[1].cancel()
+        return web.Response(status=204)
+
+    def _start(self, guild_id: str, encoded: str):
+        timer = asyncio.get_running_loop().call_later(self.track_seconds, self._end, guild_id, "FINISHED")
+        self._playing[guild_id] = (encoded, timer)
+        self._event(guild_id, "TrackStartEvent", encoded)
+
+    def _end(self, guild_id: str, reason: str):
+        if not (entry := self._playing.pop(guild_id, None)):
+            return
+
+        encoded, timer = entry
+        timer.cancel()
+        self._event(guild_id, "TrackEndEvent", encoded, reason=reason)
+
+    def _event(self, guild_id: str, kind: str, encoded: str, **extra):
+        payload = {"op": "event", "type": kind, "guildId": guild_id, "encodedTrack": encoded, **extra}
+        for socket in self._sockets:
+            asyncio.create_task(socket.send_json(payload))
+
+    def _stats_payload(self) -> dict[str, Any]:
+        return {
+            "players": len(self._playing),
+            "playingPlayers": len(self._playing),
+            "uptime": int(time.monotonic() * 1000),
+            "memory": {"free": 0, "used": 0, "allocated": 0, "reservable": 0},
+            "cpu": {"cores": 1, "systemLoad": 0.0, "lavalinkLoad": 0.0},
+            "frameStats": None,
+        }
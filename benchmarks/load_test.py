@@ -0,0 +1,223 @@
+"""Load test for the Lavalink music cog, run against fake Discord and Lavalink servers on localhost.
+
+    python -m benchmarks.load_test --guilds 50 --rate 0.5 --duration 60
+
+Every guild issues commands at random times, `rate` per second on average, picked by the
+weights in --mix. Nothing leaves the machine: Lavalink is an in-process fake serving the track
+payloads in --payloads and Discord is a set of fake objects answering straight away.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import time
+from collections import Counter, defaultdict
+from pathlib import Path
+
+from benchmarks.fake_discord import FakeBot, FakeGuild, invoke
+from benchmarks.fake_lavalink import FakeLavalink
+
+
+PAYLOADS = Path(__file__).parent / "payloads" / "tracks.json"
+
+
+def percentile(values: list[float], q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(int(len(values) * q), len(values) - 1)]
+
+
+def parse_mix(spec: str) -> dict[str, float]:
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+class LoopLag:
+    """Measures how late the event loop wakes up a task that asked to sleep for `interval`."""
+
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.samples: list[float] = []
+        self._task: asyncio.Task | None = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        self._task.cancel()
+
+    async def _run(self):
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.samples.append(time.perf_counter() - start - self.interval)
+
+
+class LoadTest:
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self.mix = parse_mix(args.mix)
+        self.latencies: dict[str, list[float]] = defaultdict(list)
+        self.errors: Counter = Counter()
+        self.shed: Counter = Counter()
+
+    def arguments(self, name: str, rng: random.Random) -> dict:
+        if name == "play":
+            n = rng.randrange(self.args.unique)
+            # Mostly searches, with some direct links, like real traffic. Video IDs are always 11 characters
+            query = f"https://www.youtube.com/watch?v=bench{n:06d}" if n % 4 == 0 else f"benchmark song {n}"
+            return {"query": query}
+        if name == "playlist":
+            return {"query": f"https://www.youtube.com/playlist?list=PLbench{rng.randrange(self.args.unique)}"}
+        if name == "queue":
+            # Calling the callback directly skips the slash command's option defaults
+            return {"page": 1}
+        return {}
+
+    async def run_guild(self, bot: FakeBot, cog, guild: FakeGuild, rng: random.Random, deadline: float):
+        commands = {"play": cog._play, "playlist": cog._play, "queue": cog._queue, "skip": cog._skip}
+        names = list(self.mix)
+        weights = [self.mix[name] for name in names]
+        author = guild.members[0]
+
+        # Every guild starts with something playing, so queue and skip have work to do
+        await self.invoke(bot, cog, commands["play"], guild, author, "play", rng)
+
+        while time.perf_counter() < deadline:
+            await asyncio.sleep(rng.expovariate(self.args.rate))
+            name = rng.choices(names, weights)[0]
+
+            if name == "skip" and not (guild.voice_client and guild.voice_client.current):
+                continue
+            await self.invoke(bot, cog, commands[name], guild, author, name, rng)
+
+    async def invoke(self, bot, cog, command, guild, author, name: str, rng: random.Random):
+        from notorious_discord_bot.cogs.music.util.command_scheduler import Overloaded
+
+        try:
+            latency = await invoke(bot, cog, command, guild, author, **self.arguments(name, rng))
+        except Overloaded:
+            self.shed[name] += 1
+        except Exception:
+            self.errors[name] += 1
+        else:
+            self.latencies[name].append(latency)
+
+    async def run(self) -> dict:
+        lavalink = FakeLavalink(
+            json.loads(Path(self.args.payloads).read_text()),
+            latency=self.args.lavalink_latency / 1000,
+            track_seconds=self.args.track_seconds,
+            playlist_size=self.args.playlist_size,
+        )
+        url = await lavalink.start()
+
+        # The cog reads its configuration when it's imported
+        os.environ["LAVALINK_NODES"] = url
+        os.environ.setdefault("WAVELINK_PW", "benchmark")
+        import wavelink
+        from notorious_discord_bot.cogs.music.music import Music
+
+        bot = FakeBot()
+        cog = Music(bot)
+        bot.add_cog(cog)
+
+        connect_deadline = time.perf_counter() + 10
+        while not any(node.status is wavelink.NodeStatus.CONNECTED for node in wavelink.NodePool.nodes.values()):
+            if time.perf_counter() > connect_deadline:
+                raise SystemExit("Couldn't connect to the fake Lavalink node")
+            await asyncio.sleep(0.05)
+
+        guilds = [FakeGuild(bot, listeners=self.args.listeners) for _ in range(self.args.guilds)]
+        lag = LoopLag()
+        lag.start()
+
+        start = time.perf_counter()
+        deadline = start + self.args.duration
+        await asyncio.gather(*(
+            self.run_guild(bot, cog, guild, random.Random(self.args.seed + i), deadline)
+            for i, guild in enumerate(guilds)
+        ))
+        elapsed = time.perf_counter() - start
+
+        lag.stop()
+        for guild in guilds:
+            if guild.voice_client:
+                await cog.disconnect_player(guild.voice_client)
+        cog.cog_unload()
+        await lavalink.close()
+
+        total = sum(len(latencies) for latencies in self.latencies.values())
+        return {
+            "guilds": self.args.guilds,
+            "seconds": round(elapsed, 2),
+            "commands": total,
+            "throughput": round(total / elapsed, 2),
+            "latency_ms": {
+                name: {
+                    "count": len(latencies),
+                    "p50": round(percentile(latencies, 0.5) * 1000, 2),
+                    "p99": round(percentile(latencies, 0.99) * 1000, 2),
+                    "mean": round(statistics.fmean(latencies) * 1000, 2),
+                }
+                for name, latencies in sorted(self.latencies.items())
+                if latencies
+            },
+            "errors": dict(self.errors),
+            "shed": dict(self.shed),
+            "loop_lag_ms": {
+                "p50": round(percentile(lag.samples, 0.5) * 1000, 2),
+                "p99": round(percentile(lag.samples, 0.99) * 1000, 2),
+                "max": round(max(lag.samples, default=0.0) * 1000, 2),
+            },
+            "lavalink_requests": dict(lavalink.requests),
+            "discord_calls": dict(bot.api_calls),
+            "track_cache": cog.track_cache.stats,
+            "dispatcher": cog.dispatcher.stats,
+            "scheduler": cog.scheduler.stats,
+            "players": cog.reaper.stats,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--guilds", type=int, default=20, help="guilds issuing commands at the same time")
+    parser.add_argument("--rate", type=float, default=0.5, help="commands per second per guild, on average")
+    parser.add_argument("--duration", type=float, default=30, help="seconds to run for")
+    parser.add_argument("--mix", default="play=5,queue=3,skip=2,playlist=1", help="relative weights of each command")
+    parser.add_argument("--unique", type=int, default=200, help="distinct songs and playlists to pick from")
+    parser.add_argument("--listeners", type=int, default=3, help="members in each guild's voice channel")
+    parser.add_argument("--track-seconds", type=float, default=20, help="how long each fake track plays")
+    parser.add_argument("--playlist-size", type=int, default=100, help="tracks in each fake playlist")
+    parser.add_argument("--lavalink-latency", type=float, default=5, help="milliseconds the fake node takes to answer")
+    parser.add_argument("--payloads", default=str(PAYLOADS), help="JSON list of Lavalink v3 track payloads to serve")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+
+    report = asyncio.run(LoadTest(args).run())
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"{report['commands']} commands from {report['guilds']} guilds in {report['seconds']}s, {report['throughput']}/s")
+    for name, stats in report["latency_ms"].items():
+        print(f"  {name:<9} n={stats['count']:<6} p50={stats['p50']}ms p99={stats['p99']}ms mean={stats['mean']}ms")
+    print(f"  errors: {report['errors'] or 'none'}, shed: {report['shed'] or 'none'}")
+    print(f"scheduler: {report['scheduler']}")
+    lag = report["loop_lag_ms"]
+    print(f"event loop lag: p50={lag['p50']}ms p99={lag['p99']}ms max={lag['max']}ms")
+    print(f"lavalink requests: {report['lavalink_requests']}")
+    print(f"discord calls: {report['discord_calls']}")
+    print(f"track cache: {report['track_cache']}, dispatcher: {report['dispatcher']}, players: {report['players']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,6 @@
 import json
 import math
+import time
 import discord
 
 from discord.ext import commands
@@ -7,6 +8,10 @@ from loguru import logger
 
 import wavelink
 
+from notorious_discord_bot.cogs.music.util.audio_cache import audio_cache
+from notorious_discord_bot.cogs.music.util.audio_filter import AudioFilter
+from notorious_discord_bot.cogs.music.util.idle_reaper import IdleReaper
+from notorious_discord_bot.cogs.music.util.metrics import metrics
 from notorious_discord_bot.cogs.music.util.song import Song
 
 from notorious_discord_bot.cogs.music.util.voice_state import VoiceState
@@ -15,21 +20,40 @@ from notorious_discord_bot.cogs.music.util.ytdl_source import VoiceError, YTDLEr
 
 
 class Music(commands.Cog):
+    required_intents = discord.Intents(guilds=True, voice_states=True, guild_messages=True, message_content=True)
+
     def __init__(self, bot: commands.Bot):
         self.bot = bot
         self.voice_states = {}
+        self.reaper = IdleReaper()
+        metrics.gauge("legacy_players", lambda: self.reaper.stats, "Legacy voice players by state")
+        metrics.gauge("ytdl_pool", lambda: YTDLSource.pool.stats, "youtube_dl worker pool usage")
+        metrics.gauge("ytdl_info_cache", lambda: YTDLSource.infos.stats, "Extracted info dict cache usage")
+        metrics.gauge("ytdl_lookups", lambda: YTDLSource.lookups.stats, "Extractions made and shared with identical concurrent ones")
+        if audio_cache:
+            metrics.gauge("audio_cache", lambda: audio_cache.stats, "Transcoded audio cache usage")
 
     def get_voice_state(self, ctx: commands.Context):
         state = self.voice_states.get(ctx.guild.id)
         if not state:
             state = VoiceState(self.bot, ctx)
             self.voice_states[ctx.guild.id] = state
+            self.reaper.track(ctx.guild.id, state.usage, lambda: self.close_voice_state(ctx.guild.id))
 
         return state
 
+    async def close_voice_state(self, guild_id: int):
+        self.reaper.forget(guild_id)
+        if state := self.voice_states.pop(guild_id, None):
+            await state.stop()
+
     def cog_unload(self):
+        self.reaper.stop()
         for state in self.voice_states.values():
             self.bot.loop.create_task(state.stop())
+        YTDLSource.pool.shutdown()
+        if audio_cache:
+            audio_cache.close()
 
     def cog_check(self, ctx: commands.Context):
         if not ctx.guild:
@@ -40,11 +64,16 @@ class Music(commands.Cog):
         return True
 
     async def cog_before_invoke(self, ctx: commands.Context):
+        ctx.started = time.perf_counter()
         ctx.voice_state = self.get_voice_state(ctx)
 
+    async def cog_after_invoke(self, ctx: commands.Context):
+        metrics.observe("legacy_command_seconds", time.perf_counter() - ctx.started, command=ctx.command.qualified_name)
+
     async def cog_command_error(
         self, ctx: commands.Context, error: commands.CommandError
     ):
+        metrics.inc("legacy_command_errors_total", command=ctx.command.qualified_name if ctx.command else "unknown")
         await ctx.send("An error occurred: {}".format(str(error)))
 
     @commands.command(name="join", invoke_without_subcommand=True)
@@ -88,8 +117,7 @@ class Music(commands.Cog):
         if not ctx.voice_state.voice:
             return await ctx.send("Not connected to any voice channel.")
 
-        await ctx.voice_state.stop()
-        del self.voice_states[ctx.guild.id]
+        await self.close_voice_state(ctx.guild.id)
 
     @commands.command(name="volume")
     async def _volume(self, ctx: commands.Context, *, volume: int):
@@ -106,13 +134,26 @@ class Music(commands.Cog):
 
     @commands.command(name="boost")
     async def _bassboost(self, ctx: commands.Context, *, scale: int):
-        """Bass boosts"""
+        """Boosts or cuts the bass by a gain in dB, 0 turns it off."""
+
+        if not AudioFilter.supported:
+            return await ctx.send("Bass boost isn't available on this bot.")
+
+        ctx.voice_state.set_bass(scale)
+        await ctx.send(f"Bass set to {scale:+d} dB")
+
+    @commands.command(name="eq")
+    async def _equalizer(self, ctx: commands.Context, frequency: int, gain: float):
+        """Boosts or cuts the frequencies around one in Hz by a gain in dB, a gain of 0 resets it."""
 
-        ctx.voice_client.source.ffmpeg_options["options"].replace(
-            "bass=g=1", f"bass=g={scale}"
-        )
+        if not AudioFilter.supported:
+            return await ctx.send("The equalizer isn't available on this bot.")
 
-        await ctx.send(f"Bass boosted {scale*100}%")
+        if not 20 <= frequency <= 20000:
+            return await ctx.send("Frequency must be between 20 and 20000 Hz.")
+
+        ctx.voice_state.set_band(frequency, gain)
+        await ctx.message.add_reaction("✅")
 
     @commands.command(name="now", aliases=["current", "playing"])
     async def _now(self, ctx: commands.Context):
@@ -195,7 +236,7 @@ class Music(commands.Cog):
 
         queue = ""
         for i, song in enumerate(ctx.voice_state.songs[start:end], start=start):
-            queue += "`{0}.` [**{1.source.title}**]({1.source.url})\n".format(
+            queue += "`{0}.` [**{1.info.title}**]({1.info.uri})\n".format(
                 i + 1, song
             )
 
@@ -212,6 +253,7 @@ class Music(commands.Cog):
             return await ctx.send("Empty queue.")
 
         ctx.voice_state.songs.shuffle()
+        ctx.voice_state.preload()
         await ctx.message.add_reaction("✅")
 
     @commands.command(name="remove")
@@ -222,8 +264,31 @@ class Music(commands.Cog):
             return await ctx.send("Empty queue.")
 
         ctx.voice_state.songs.remove(index - 1)
+        ctx.voice_state.preload()
         await ctx.message.add_reaction("✅")
 
+    @commands.command(name="move")
+    async def _move(self, ctx: commands.Context, source: int, destination: int):
+        """Moves a song in the queue from one index to another."""
+
+        if len(ctx.voice_state.songs) == 0:
+            return await ctx.send("Empty queue.")
+
+        ctx.voice_state.songs.move(source - 1, destination - 1)
+        ctx.voice_state.preload()
+        await ctx.message.add_reaction("✅")
+
+    @commands.command(name="dedup")
+    async def _dedup(self, ctx: commands.Context):
+        """Removes duplicate songs from the queue."""
+
+        if len(ctx.voice_state.songs) == 0:
+            return await ctx.send("Empty queue.")
+
+        removed = ctx.voice_state.songs.dedup()
+        ctx.voice_state.preload()
+        await ctx.send("Removed {} duplicate songs.".format(removed))
+
     @commands.command(name="loop")
     async def _loop(self, ctx: commands.Context):
         """Loops the currently playing song.
@@ -251,16 +316,17 @@ class Music(commands.Cog):
 
         async with ctx.typing():
             try:
-                source = await YTDLSource.create_source(ctx, search, loop=self.bot.loop)
+                info = await YTDLSource.resolve(search)
             except YTDLError as e:
                 await ctx.send(
                     "An error occurred while processing this request: {}".format(str(e))
                 )
             else:
-                song = Song(source)
+                song = Song(info, ctx)
 
                 await ctx.voice_state.songs.put(song)
-                await ctx.send("Enqueued {}".format(str(source)))
+                ctx.voice_state.preload()
+                await ctx.send("Enqueued {}".format(str(song)))
 
 
     @_join.before_invoke
@@ -272,3 +338,7 @@ class Music(commands.Cog):
         if ctx.voice_client:
             if ctx.voice_client.channel != ctx.author.voice.channel:
                 raise commands.CommandError("Bot is already in a voice channel.")
+
+
+def setup(bot: commands.Bot):
+    bot.add_cog(Music(bot))
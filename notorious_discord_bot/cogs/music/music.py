@@ -1,47 +1,239 @@
+import asyncio
 import math
+import time
 import traceback
-import re
 from typing import Literal
-from wavelink import Equalizer, Filter, TrackEventPayload
+from wavelink import TrackEventPayload
 from wavelink.ext import spotify
 import os
 import discord
 
 from discord.ext import commands
-from discord.commands import ApplicationContext, Option, slash_command
+from discord.commands import ApplicationContext, AutocompleteContext, Option, OptionChoice, slash_command
 from loguru import logger
 
 import wavelink
 
+from notorious_discord_bot.cogs.music.util.command_scheduler import CommandScheduler, Overloaded
+from notorious_discord_bot.cogs.music.util.embed_cache import EmbedCache
+from notorious_discord_bot.cogs.music.util.idle_reaper import IdleReaper, PlayerUsage
+from notorious_discord_bot.cogs.music.util.message_dispatcher import MessageDispatcher
+from notorious_discord_bot.cogs.music.util.metrics import metrics
+from notorious_discord_bot.cogs.music.util.node_balancer import NodeBalancer, parse_nodes
+from notorious_discord_bot.cogs.music.util.player import BASS_PRESETS, MusicPlayer
+from notorious_discord_bot.cogs.music.util.player_store import PlayerSnapshot, PlayerStore
+from notorious_discord_bot.cogs.music.util.prefetcher import TrackPrefetcher
+from notorious_discord_bot.cogs.music.util.search_index import SearchIndex
+from notorious_discord_bot.cogs.music.util.single_flight import SingleFlight
+from notorious_discord_bot.cogs.music.util.track_cache import TrackCache
+from notorious_discord_bot.cogs.music.util.url_router import Route, route as route_query
+
 
 
 SHORT_DELAY = 5.0
 NORMAL_DELAY = 10.0
 LONG_DELAY = 30.0
 
+TRACK_CACHE_SIZE = int(os.getenv("TRACK_CACHE_SIZE", 2048))
+TRACK_CACHE_TTL = float(os.getenv("TRACK_CACHE_TTL", 6 * 60 * 60))
+TRACK_CACHE_PATH = os.getenv("TRACK_CACHE_PATH")
+# How long everyone waiting on the same lookup waits for Lavalink before giving up
+RESOLVE_TIMEOUT = float(os.getenv("RESOLVE_TIMEOUT", 20))
+
+PLAYER_STATE_PATH = os.getenv("PLAYER_STATE_PATH")
+# Gap between players reconnecting after a restart, so they don't all hit the voice gateway at once
+PLAYER_RESTORE_INTERVAL = float(os.getenv("PLAYER_RESTORE_INTERVAL", 0.5))
+
+PLAYLIST_MAX_TRACKS = int(os.getenv("PLAYLIST_MAX_TRACKS", 500))
+PLAYLIST_BATCH_SIZE = 50
+PLAYLIST_PROGRESS_INTERVAL = 1.0
+
+LAVALINK_NODES = os.getenv("LAVALINK_NODES", "http://localhost:2333")
+LAVALINK_STATS_INTERVAL = float(os.getenv("LAVALINK_STATS_INTERVAL", 30))
+
+PREFETCH_DEPTH = int(os.getenv("PREFETCH_DEPTH", 3))
+PREFETCH_CONCURRENCY = int(os.getenv("PREFETCH_CONCURRENCY", 2))
+
+SEARCH_INDEX_SIZE = int(os.getenv("SEARCH_INDEX_SIZE", 5000))
+
+# Commands that resolve tracks and so wait their guild's turn for a scheduler slot, the rest are only rate limited
+RESOLVING_COMMANDS = {"play"}
+
+
+async def suggest_tracks(ctx: AutocompleteContext) -> list[OptionChoice]:
+    """Suggests tracks the bot has already resolved as a /play query is typed, without asking Lavalink."""
+    index: SearchIndex = ctx.cog.search_index
+    return [
+        OptionChoice(name=f"{track.title} - {track.author}"[:100], value=track.uri)
+        for track in index.search(ctx.interaction.guild_id, ctx.value or "")
+        # Discord caps choice values at 100 characters
+        if len(track.uri) <= 100
+    ]
+
 class Music(commands.Cog):
+    required_intents = discord.Intents(guilds=True, voice_states=True)
+
     def __init__(self, bot: commands.Bot) -> None:
        self.bot = bot
+       self.track_cache = TrackCache(max_size=TRACK_CACHE_SIZE, ttl=TRACK_CACHE_TTL, path=TRACK_CACHE_PATH)
+       self.lookups = SingleFlight(timeout=RESOLVE_TIMEOUT)
+       self.ingest_tasks: dict[int, set[asyncio.Task]] = {}
+       self.prefetchers: dict[int, TrackPrefetcher] = {}
+       self.balancer = NodeBalancer(interval=LAVALINK_STATS_INTERVAL, player_cls=MusicPlayer)
+       self.dispatcher = MessageDispatcher()
+       self.embed_cache = EmbedCache()
+       self.search_index = SearchIndex(max_tracks=SEARCH_INDEX_SIZE)
+       self.reaper = IdleReaper()
+       self.scheduler = CommandScheduler()
+       self.player_store = PlayerStore(PLAYER_STATE_PATH) if PLAYER_STATE_PATH else None
+       self.restore_task: asyncio.Task | None = None
+       self.spotify_client: spotify.SpotifyClient | None = None
+       metrics.gauge("music_players", lambda: self.reaper.stats, "Lavalink players by state")
+       metrics.gauge("music_track_cache", lambda: self.track_cache.stats, "Resolved track cache usage")
+       metrics.gauge("music_lookups", lambda: self.lookups.stats, "Lavalink lookups made and shared with identical concurrent ones")
+       metrics.gauge("music_search_index", lambda: self.search_index.stats, "Tracks offered as /play suggestions")
+       metrics.gauge("music_scheduler", lambda: self.scheduler.stats, "Commands running, queued and shed by the scheduler")
+       metrics.gauge("music_dispatcher", lambda: self.dispatcher.stats, "Discord API calls made and saved by batching")
+       if self.player_store:
+           metrics.gauge("music_player_store", lambda: self.player_store.stats, "Players whose state is saved for restarts")
        bot.loop.create_task(self.connect_lavalink_nodes())
 
-    async def connect_lavalink_nodes(self):
-        """Connect to lavalink node"""
-        await self.bot.wait_until_ready()
+    def cog_unload(self):
+        for guild_id in list(self.ingest_tasks):
+            self.cancel_ingestion(guild_id)
+        for prefetcher in self.prefetchers.values():
+            prefetcher.cancel()
+        self.balancer.stop()
+        self.reaper.stop()
+        self.dispatcher.close()
+        self.track_cache.close()
+        if self.restore_task:
+            self.restore_task.cancel()
+        if self.player_store:
+            self.player_store.close()
 
-        node: wavelink.Node = wavelink.Node(uri="http://localhost:2333", password=os.getenv("WAVELINK_PW"))
-        self.node = node
-        spotify_client = spotify.SpotifyClient(
-                    client_id=os.getenv("SPOTIFY_CLIENT_ID"), 
-                    client_secret=os.getenv("SPOTIFY_CLIENT_SECRET"))
-        
-        await wavelink.NodePool.connect(client=self.bot, nodes=[node],
-                                        spotify=spotify_client)
+    async def connect_lavalink_nodes(self):
+        """Connect to lavalink nodes"""
+        # Lavalink only needs the bot's user ID, which login sets long before the gateway is ready
+        while self.bot.user is None:
+            await asyncio.sleep(0.1)
+
+        start = time.perf_counter()
+        nodes = parse_nodes(LAVALINK_NODES, os.getenv("WAVELINK_PW"))
+        await wavelink.NodePool.connect(client=self.bot, nodes=nodes)
+        self.balancer.start()
+        logger.info(f"Connected to {len(nodes)} Lavalink node{'s' if len(nodes) != 1 else ''} in {time.perf_counter() - start:.2f}s")
+
+    def ensure_spotify(self):
+        """Creates the Spotify client on the first Spotify link, plenty of sessions never see one."""
+        if self.spotify_client is None:
+            self.spotify_client = spotify.SpotifyClient(
+                client_id=os.getenv("SPOTIFY_CLIENT_ID"),
+                client_secret=os.getenv("SPOTIFY_CLIENT_SECRET"))
+
+        # wavelink looks the client up on whichever node a search runs on
+        for node in wavelink.NodePool.nodes.values():
+            if node._spotify is None:
+                node._spotify = self.spotify_client
 
     @commands.Cog.listener()
+    @metrics.timed("music_listener_seconds", listener="node_ready")
     async def on_wavelink_node_ready(self, node: wavelink.Node):
         """Event fired when a node has finished connecting"""
         logger.info(f"Lavalink Node: <{node.id}> is ready")
+        if self.player_store and not self.restore_task:
+            self.restore_task = self.bot.loop.create_task(self.restore_players())
 
+    async def restore_players(self):
+        """Brings back the players that were live when the bot last stopped, one at a time.
+
+        Deliberately not concurrent: every restore is a voice connect through the gateway plus a
+        Lavalink play, and after a restart those would all land at once for every guild. One at a
+        time, PLAYER_RESTORE_INTERVAL apart, keeps that burst flat, and the most recently active guilds come back first.
+        """
+        # Lavalink can be up before the gateway is, channels and their members are only cached once it's ready
+        await self.bot.wait_until_ready()
+        for snapshot in await self.player_store.load():
+            channel = self.bot.get_channel(snapshot.channel_id)
+            # Nobody to play to, the reaper would only disconnect it again
+            if not isinstance(channel, (discord.VoiceChannel, discord.StageChannel)) or not any(not member.bot for member in channel.members):
+                self.player_store.forget(snapshot.guild_id)
+                continue
+            if channel.guild.voice_client:
+                continue
+
+            try:
+                # Decoding the queue fails for rows saved in a format this version no longer reads
+                if snapshot.current is None and not snapshot.tracks():
+                    self.player_store.forget(snapshot.guild_id)
+                    continue
+                await self.restore_player(channel, snapshot)
+            except Exception as e:
+                logger.warning(f"Couldn't restore player for guild {snapshot.guild_id}: {e}")
+                self.player_store.forget(snapshot.guild_id)
+            await asyncio.sleep(PLAYER_RESTORE_INTERVAL)
+
+    async def restore_player(self, channel: discord.VoiceChannel, snapshot: PlayerSnapshot):
+        vc: MusicPlayer = await channel.connect(cls=self.balancer.create_player)
+        self.watch_player(vc)
+
+        vc.queue.loop = snapshot.loop
+        vc.queue.extend(snapshot.tracks(), atomic=False)
+        if snapshot.volume != vc.volume:
+            await vc.set_volume(snapshot.volume)
+        if snapshot.bass != "off":
+            await vc.set_bass(snapshot.bass, seek=False)
+
+        # The current track was already resolved once, its stored payload plays as is
+        if snapshot.current:
+            current = snapshot.current.track()
+            await vc.play(current, start=snapshot.position)
+            if snapshot.paused:
+                await vc.pause()
+            self.get_prefetcher(vc).prefetch(vc.queue)
+            self.dispatcher.now_playing(vc.guild.id, channel, self.create_embed(current))
+        elif not vc.queue.is_empty:
+            await self.play_next(channel, vc)
+
+        logger.info(f"Restored player for guild {snapshot.guild_id} with {vc.queue.count} queued tracks")
+
+    async def _resolve(self, kind: str, canonical_id: str, search):
+        """Returns the cached result for a canonical ID, only calling search() on a miss.
+
+        Identical lookups that arrive while one is already running wait on that one instead of searching again.
+        """
+        key = f"{kind}:{canonical_id}"
+
+        if (result := self.track_cache.get(key)) is not None:
+            logger.debug(f"Track cache hit for {key} {self.track_cache.stats}")
+            metrics.inc("music_resolve_total", kind=kind, cache="hit")
+            return result
+
+        metrics.inc("music_resolve_total", kind=kind, cache="miss")
+        with metrics.timer("music_resolve_seconds", kind=kind):
+            return await self.lookups.do(key, lambda: self._search(key, search))
+
+    async def _search(self, key: str, search):
+        result = await search()
+        if result:
+            self.track_cache.put(key, result)
+        return result
+
+    def get_prefetcher(self, vc: wavelink.Player) -> TrackPrefetcher:
+        prefetcher = self.prefetchers.get(vc.guild.id)
+        if not prefetcher:
+            # Queued Spotify tracks are TrackInfo records, rebuilt only when they have to be searched for
+            resolver = lambda track: self._resolve(
+                "partial", track.id, lambda: track.track().fulfill(player=vc, cls=wavelink.YouTubeTrack, populate=False)
+            )
+            prefetcher = TrackPrefetcher(resolver, depth=PREFETCH_DEPTH, concurrency=PREFETCH_CONCURRENCY)
+            self.prefetchers[vc.guild.id] = prefetcher
+
+        return prefetcher
+
+    def drop_prefetcher(self, guild_id: int):
+        if prefetcher := self.prefetchers.pop(guild_id, None):
+            prefetcher.cancel()
 
     def cog_check(self, ctx: ApplicationContext):
         if not ctx.guild:
@@ -51,58 +243,193 @@ class Music(commands.Cog):
 
         return True
 
+    async def cog_before_invoke(self, ctx: ApplicationContext):
+        ctx.started = time.perf_counter()
+        ctx.ticket = None
+
+        self.scheduler.check_rate(ctx.guild.id, ctx.author.id)
+        if ctx.command.qualified_name in RESOLVING_COMMANDS:
+            # Refuse before deferring, a deferred interaction's reply can't be made ephemeral any more
+            self.scheduler.check_capacity(ctx.guild.id, ctx.author.id)
+            # Waiting for a turn can outlast the 3s Discord gives an interaction to be answered
+            await ctx.defer()
+            ctx.ticket = await self.scheduler.acquire(ctx.guild.id, ctx.author.id)
+            metrics.observe("music_scheduler_wait_seconds", time.perf_counter() - ctx.started)
+
+    async def cog_after_invoke(self, ctx: ApplicationContext):
+        # py-cord only runs this once every before hook has passed, so the ticket is always ours to release
+        if ctx.ticket:
+            self.scheduler.release(ctx.ticket)
+        metrics.observe("music_command_seconds", time.perf_counter() - ctx.started, command=ctx.command.qualified_name)
+        if self.player_store:
+            self.player_store.mark(ctx.guild.id)
+
     async def cog_command_error(self, ctx: ApplicationContext, error: discord.ApplicationCommandError):
+        if isinstance(error, Overloaded):
+            metrics.inc("music_commands_shed_total", reason=error.reason)
+            return await ctx.respond(str(error), ephemeral=True)
+
+        metrics.inc("music_command_errors_total", command=ctx.command.qualified_name if ctx.command else "unknown")
         output = ''.join(traceback.format_tb(error.__traceback__))
         logger.error(str(error))
         logger.error(output)
-        await ctx.send(f"An error occurred: {str(error)}", delete_after=LONG_DELAY)
+        if ctx.interaction.response.is_done():
+            # A deferred command is left "thinking" until it's answered, so the error is its answer
+            response = await ctx.respond(f"An error occurred: {str(error)}")
+            self.dispatcher.delete_later(response, LONG_DELAY)
+        else:
+            self.dispatcher.send(ctx.channel, f"An error occurred: {str(error)}", delete_after=LONG_DELAY)
 
     @slash_command(name="join", invoke_without_subcommand=True)
     async def _join(self, ctx: ApplicationContext):
         """Joins a voice channel."""
         destination = ctx.author.voice.channel
-        await destination.connect(cls=wavelink.Player)
+        vc: wavelink.Player = await destination.connect(cls=self.balancer.create_player)
+        self.watch_player(vc)
+
+    def watch_player(self, vc: wavelink.Player):
+        self.reaper.track(vc.guild.id, lambda: self.player_usage(vc), lambda: self.disconnect_player(vc))
+        if self.player_store:
+            self.player_store.track(vc)
+
+    @staticmethod
+    def player_usage(vc: wavelink.Player) -> PlayerUsage:
+        listeners = sum(1 for member in vc.channel.members if not member.bot) if vc.channel else 0
+        return PlayerUsage(vc.is_playing(), listeners, len(vc.queue))
+
+    async def disconnect_player(self, vc: wavelink.Player):
+        guild_id = vc.guild.id
+        self.reaper.forget(guild_id)
+        if self.player_store:
+            self.player_store.forget(guild_id)
+        self.cancel_ingestion(guild_id)
+        self.drop_prefetcher(guild_id)
+        self.dispatcher.clear_now_playing(guild_id)
+        await vc.disconnect(force=True)
 
     @slash_command(name="play")
-    async def _play(self, ctx: ApplicationContext, *, query: Option(str, "Song source (e.g. youtube link, spotify link, plain search query)")):
+    async def _play(self, ctx: ApplicationContext, *, query: Option(str, "Song source (e.g. youtube link, spotify link, plain search query)", autocomplete=suggest_tracks)):
         """Plays a video from youtube. Can handle youtube links and general search queries."""
         if not ctx.voice_client:
             await ctx.invoke(self._join)
 
-        youtube_regex = 'https:\/\/www.youtube.com\/(watch\?v=.*|playlist\?list=.*)|https:\/\/youtu.be\/.*'
-        spotify_regex = 'https:\/\/open.spotify.com\/(track|album|playlist)\/(.+)\?si=.+'
-
         vc: wavelink.Player = ctx.voice_client
         vc.queue.loop = False
 
-        if match := re.match(youtube_regex, query):
-            logger.info(f"YOUTUBE MATCH: {match.groups}")
-            if 'watch' in match.group(1):
-                result = (await self.node.get_tracks(wavelink.YouTubeTrack, query))[0]
-                await vc.queue.put_wait(result)
-                response = await ctx.respond(f"Added **{result.title}** by **{result.author}** to the queue")
-                await response.delete_original_response(delay=SHORT_DELAY)
-            if 'list' in match.group(1):
-                playlist = await vc.node.get_playlist(wavelink.YouTubePlaylist, query) 
-                for song in playlist.tracks:
-                    vc.queue.put(song)      
-                response = await ctx.respond(f"Added **{len(playlist.tracks)}** song{'s' if len(playlist.tracks) > 1 else ''} to the queue")
-                await response.delete_original_response(delay=SHORT_DELAY)
-        elif groups := re.match(spotify_regex, query):
-            logger.info(groups)
-            track = await spotify.SpotifyTrack.search(query)
-            await vc.queue.put_wait(track)
+        with metrics.timer("music_play_stage_seconds", stage="match"):
+            route = route_query(query)
+        logger.info(f"Routed /play query to {route}")
+
+        if route.kind == "track":
+            result = (await self._resolve("track", route.id, lambda: self.balancer.best().get_tracks(wavelink.YouTubeTrack, route.url)))[0]
+            await self.enqueue(vc, result)
+            self.search_index.add(result)
+            response = await ctx.respond(f"Added **{result.title}** by **{result.author}** to the queue")
+            self.dispatcher.delete_later(response, SHORT_DELAY)
+        elif route.kind == "playlist":
+            playlist = await self._resolve("playlist", route.id, lambda: vc.current_node.get_playlist(wavelink.YouTubePlaylist, route.url))
+            if not playlist or not playlist.tracks:
+                return await ctx.respond("Couldn't find any songs in that playlist.")
+            await self.queue_playlist(ctx, vc, playlist.tracks)
+        elif route.kind == "spotify_playlist":
+            self.ensure_spotify()
+            tracks = await self._resolve("spotify_playlist", route.id, lambda: self.spotify_collection(route))
+            if not tracks:
+                return await ctx.respond("Couldn't find any songs in that album or playlist.")
+            await self.queue_playlist(ctx, vc, tracks)
+        elif route.kind == "spotify":
+            self.ensure_spotify()
+            track = await self._resolve("spotify", route.id, lambda: spotify.SpotifyTrack.search(route.url, node=self.balancer.best()))
+            await self.enqueue(vc, track)
+            self.search_index.add(track)
             response = await ctx.respond("Added to the queue")
-            await response.delete_original_response(delay=SHORT_DELAY)
+            self.dispatcher.delete_later(response, SHORT_DELAY)
+        else:
+            result = await self._resolve("search", route.id, lambda: wavelink.YouTubeTrack.search(route.url, return_first=True, node=self.balancer.best()))
+            await self.enqueue(vc, result)
+            self.search_index.add(result)
+            # The deferred interaction stays on "thinking" until it gets a reply
+            response = await ctx.respond(f"Added **{result.title}** by **{result.author}** to the queue")
+            self.dispatcher.delete_later(response, SHORT_DELAY)
+
+        if not vc.is_playing():
+            await self.play_next(ctx.channel, vc)
         else:
-            result = await wavelink.YouTubeTrack.search(query, return_first=True)
-            await vc.queue.put_wait(result)
+            self.get_prefetcher(vc).prefetch(vc.queue)
 
+    async def queue_playlist(self, ctx: ApplicationContext, vc: wavelink.Player, tracks: list):
+        capped = f" (capped at {PLAYLIST_MAX_TRACKS})" if len(tracks) > PLAYLIST_MAX_TRACKS else ""
+        tracks = tracks[:PLAYLIST_MAX_TRACKS]
+
+        # Start the first song straight away and stream the rest of the playlist in behind it
+        vc.queue.put(tracks[0])
         if not vc.is_playing():
-            next_up = vc.queue.get()
-            next_song = await next_up._search() if type(next_up).__name__ == "PartialTrack" else next_up
+            await self.play_next(ctx.channel, vc)
+
+        await ctx.respond(f"Adding **{len(tracks)}** song{'s' if len(tracks) > 1 else ''} to the queue{capped}")
+        # The command was deferred, so progress goes into the interaction's original response
+        self.start_ingestion(ctx.guild.id, vc, tracks[1:], ctx.interaction)
+
+    async def spotify_collection(self, route: Route) -> list[spotify.SpotifyTrack]:
+        """Every track of a Spotify album or playlist.
+
+        SpotifyTrack.search can't build either, playlist items wrap their track and album tracks
+        come without external IDs, so the raw items are fetched and turned into tracks here.
+        """
+        kind = spotify.SpotifySearchType[route.id.split("/")[0]]
+        items = await self.balancer.best()._spotify._search(query=route.url, type=kind, iterator=True)
+        return [spotify.SpotifyTrack({"external_ids": {}, **item}) for item in items if item]
+
+    async def enqueue(self, vc: wavelink.Player, track: wavelink.Playable):
+        with metrics.timer("music_play_stage_seconds", stage="queue"):
+            await vc.queue.put_wait(track)
+
+    async def play_next(self, channel: discord.abc.Messageable, vc: wavelink.Player):
+        """Pulls the next song off the queue, plays it and announces it."""
+        prefetcher = self.get_prefetcher(vc)
+        with metrics.timer("music_play_stage_seconds", stage="resolve"):
+            next_song = await prefetcher.resolve(vc.queue.get())
+        with metrics.timer("music_play_stage_seconds", stage="play"):
             await vc.play(next_song)
-            await ctx.channel.send(embed=self.create_embed(next_song), delete_after=LONG_DELAY)
+        # Resolve whatever is coming up next while this song plays
+        prefetcher.prefetch(vc.queue)
+        self.search_index.played(vc.guild.id, next_song)
+        if self.player_store:
+            self.player_store.mark(vc.guild.id)
+        with metrics.timer("music_play_stage_seconds", stage="embed"):
+            embed = self.create_embed(next_song)
+        self.dispatcher.now_playing(vc.guild.id, channel, embed)
+
+    def start_ingestion(self, guild_id: int, vc: wavelink.Player, tracks: list[wavelink.YouTubeTrack], response: discord.Interaction):
+        """Loads the rest of a playlist into the queue in the background."""
+        task = self.bot.loop.create_task(self._ingest_playlist(vc, tracks, response))
+        tasks = self.ingest_tasks.setdefault(guild_id, set())
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+
+    def cancel_ingestion(self, guild_id: int):
+        for task in self.ingest_tasks.pop(guild_id, ()):
+            task.cancel()
+
+    async def _ingest_playlist(self, vc: wavelink.Player, tracks: list[wavelink.YouTubeTrack], response: discord.Interaction):
+        total = len(tracks) + 1
+        last_update = time.monotonic()
+
+        for start in range(0, len(tracks), PLAYLIST_BATCH_SIZE):
+            vc.queue.extend(tracks[start:start + PLAYLIST_BATCH_SIZE], atomic=False)
+            if self.player_store:
+                self.player_store.mark(vc.guild.id)
+            # Yield between batches so a big playlist doesn't hold up the event loop
+            await asyncio.sleep(0)
+
+            loaded = min(start + PLAYLIST_BATCH_SIZE, len(tracks)) + 1
+            if loaded < total and time.monotonic() - last_update >= PLAYLIST_PROGRESS_INTERVAL:
+                await response.edit_original_response(content=f"Loading playlist... **{loaded}/{total}**")
+                last_update = time.monotonic()
+
+        self.get_prefetcher(vc).prefetch(vc.queue)
+        await response.edit_original_response(content=f"Added **{total}** song{'s' if total > 1 else ''} to the queue")
+        self.dispatcher.delete_later(response, SHORT_DELAY)
 
 
     @slash_command(name="pause")
@@ -112,7 +439,7 @@ class Music(commands.Cog):
         if vc.is_playing():
             await vc.pause()
             response = await ctx.respond(f"Paused at {self.parse_duration(vc.position / 1000)}/{self.parse_duration(vc.current.duration / 1000)}")
-            await response.delete_original_response(delay=LONG_DELAY)
+            self.dispatcher.delete_later(response, LONG_DELAY)
 
     @slash_command(name="resume")
     async def _resume(self, ctx: ApplicationContext):
@@ -121,7 +448,7 @@ class Music(commands.Cog):
         if vc.is_paused():
             await vc.resume()
             response = await ctx.respond("⏯")
-            await response.delete_original_response(delay=SHORT_DELAY)
+            self.dispatcher.delete_later(response, SHORT_DELAY)
 
     @slash_command(name="volume")
     async def _volume(self, ctx: ApplicationContext, level: Option(int, "Volume to set to", min_value=0, max_value=300)):
@@ -129,7 +456,7 @@ class Music(commands.Cog):
         vc: wavelink.Player = ctx.voice_client
 
         response = await ctx.respond(f"Adjusting volume from `{vc.volume}%` to `{level}%`")
-        await response.delete_original_response(delay=NORMAL_DELAY)
+        self.dispatcher.delete_later(response, NORMAL_DELAY)
         await vc.set_volume(level)
 
     @slash_command(name="skip")
@@ -138,30 +465,16 @@ class Music(commands.Cog):
         vc: wavelink.Player = ctx.voice_client
         await vc.seek(vc.current.duration)
         response = await ctx.respond("Skipping song ⏭")
-        await response.delete_original_response(delay=SHORT_DELAY)
+        self.dispatcher.delete_later(response, SHORT_DELAY)
 
     @slash_command(name="bass")
-    async def _bassboost(self, ctx: ApplicationContext, level: Option(str, "Level of bass boost", choices=["off", "low", "medium", "high", "ultra", "maximum", "dummyhard"])):
+    async def _bassboost(self, ctx: ApplicationContext, level: Option(str, "Level of bass boost", choices=list(BASS_PRESETS))):
         """Bass boosts currently playing track."""
-        vc: wavelink.Player = ctx.voice_client
+        vc: MusicPlayer = ctx.voice_client
 
-        presets = {
-            "off": [(0, 0), (1, 0)],
-            "low": [(0, 0.25), (1, 0.15)],
-            "medium": [(0, 0.50), (1, 0.25)],
-            "high": [(0, 0.75), (1, 0.50)],
-            "ultra": [(0, 1), (1, 0.75)],
-            "maximum": [(0, 1), (1, 1.0)],
-            "dummyhard": [(0, 1.0), (1, 1.0), (2, 1.0), (3, 1.0), (4, 1.0)] 
-        }
-
-
-        await vc.set_filter(
-            Filter(equalizer=Equalizer(bands=presets[level])),
-            seek=True
-        )
+        await vc.set_bass(level)
         response = await ctx.respond(f"Bass changed to **{level}**")
-        await response.delete_original_response(delay=NORMAL_DELAY)
+        self.dispatcher.delete_later(response, NORMAL_DELAY)
 
     @slash_command(name="stop")
     async def _stop(self, ctx: ApplicationContext):
@@ -169,9 +482,10 @@ class Music(commands.Cog):
         vc: wavelink.Player = ctx.voice_client
 
         response = await ctx.respond("Stopping song ⏹")
-        await response.delete_original_response(delay=NORMAL_DELAY)
+        self.dispatcher.delete_later(response, NORMAL_DELAY)
         await vc.stop()
-        await vc.disconnect(force=True)
+        # Same teardown as the idle reaper, which also stops it from reaping this player later
+        await self.disconnect_player(vc)
 
     @slash_command(name="leave")
     async def _leave(self, ctx: ApplicationContext):
@@ -179,14 +493,15 @@ class Music(commands.Cog):
         vc: wavelink.Player = ctx.voice_client
         
         response = await ctx.respond("Goodbye!")
-        await response.delete_original_response(delay=NORMAL_DELAY)
-        await vc.disconnect(force=True)
+        self.dispatcher.delete_later(response, NORMAL_DELAY)
+        await self.disconnect_player(vc)
 
     @slash_command(name="now")
     async def _nowplaying(self, ctx: ApplicationContext):
         """Displays currently playing track."""
-        response = await ctx.respond(embed=self.create_embed(ctx.voice_client.current))
-        await response.delete_original_response(delay=LONG_DELAY)
+        vc: wavelink.Player = ctx.voice_client
+        response = await ctx.respond(embed=self.create_embed(vc.current, position=vc.position))
+        self.dispatcher.delete_later(response, LONG_DELAY)
 
     @slash_command(name="loop")
     async def _loop(self, ctx: ApplicationContext):
@@ -196,7 +511,7 @@ class Music(commands.Cog):
         vc.queue.loop = not vc.queue.loop
 
         response = await ctx.respond(f"Turned {'on' if vc.queue.loop else 'off'} looping")
-        await response.delete_original_response(delay=SHORT_DELAY)
+        self.dispatcher.delete_later(response, SHORT_DELAY)
 
     @slash_command(name="queue")
     async def _queue(self, ctx: ApplicationContext, *, page: Option(int, "Page to go to", default=1)):
@@ -213,7 +528,7 @@ class Music(commands.Cog):
         end = start + items_per_page
 
         queue = ""
-        for i, song in enumerate(list(vc.queue)[start:end], start=start):
+        for i, song in enumerate(vc.queue.page(start, end), start=start):
             # queue += f"`{i+1}.` [**{song.title}**]({song.uri})\n"
             queue += f"`{i+1}.` {song.title}\n"
 
@@ -221,10 +536,53 @@ class Music(commands.Cog):
             description=f"**{vc.queue.count} tracks:**\n\n{queue}"
         ).set_footer(text=f"Viewing page {page}/{pages}")
         response = await ctx.respond(embed=embed)
-        await response.delete_original_response(delay=LONG_DELAY)
+        self.dispatcher.delete_later(response, LONG_DELAY)
             
 
-    def create_embed(self, song: wavelink.YouTubeTrack) -> discord.Embed:
+    @slash_command(name="remove")
+    async def _remove(self, ctx: ApplicationContext, index: Option(int, "Position in the queue to remove", min_value=1)):
+        """Removes a track from the queue."""
+        vc: MusicPlayer = ctx.voice_client
+
+        if index > vc.queue.count:
+            return await ctx.respond("There's no track at that position.")
+
+        song = vc.queue.remove_at(index - 1)
+        response = await ctx.respond(f"Removed **{song.title}** from the queue")
+        self.dispatcher.delete_later(response, SHORT_DELAY)
+
+    @slash_command(name="move")
+    async def _move(self, ctx: ApplicationContext, source: Option(int, "Position of the track to move", min_value=1), destination: Option(int, "Position to move it to", min_value=1)):
+        """Moves a track to a different position in the queue."""
+        vc: MusicPlayer = ctx.voice_client
+
+        if max(source, destination) > vc.queue.count:
+            return await ctx.respond("There's no track at that position.")
+
+        vc.queue.move(source - 1, destination - 1)
+        self.get_prefetcher(vc).prefetch(vc.queue)
+        response = await ctx.respond(f"Moved **{vc.queue[destination - 1].title}** to position {destination}")
+        self.dispatcher.delete_later(response, SHORT_DELAY)
+
+    @slash_command(name="dedup")
+    async def _dedup(self, ctx: ApplicationContext):
+        """Removes duplicate tracks from the queue."""
+        vc: MusicPlayer = ctx.voice_client
+
+        removed = vc.queue.dedup()
+        response = await ctx.respond(f"Removed **{removed}** duplicate{'s' if removed != 1 else ''} from the queue")
+        self.dispatcher.delete_later(response, SHORT_DELAY)
+
+    def create_embed(self, song: wavelink.YouTubeTrack, position: float | None = None) -> discord.Embed:
+        embed = self.embed_cache.get(song.identifier or song.encoded, lambda: self.render_embed(song))
+
+        if position is not None:
+            embed.add_field(name="Position", value=f"{self.parse_duration(position / 1000)}/{self.parse_duration(song.duration / 1000)}")
+
+        return embed
+
+    def render_embed(self, song: wavelink.YouTubeTrack) -> discord.Embed:
+        """Builds the parts of a track's embed that never change, see create_embed."""
         embed = (
             discord.Embed(
                 title="Now Playing",
@@ -240,21 +598,20 @@ class Music(commands.Cog):
         return embed
 
     @commands.Cog.listener()
+    @metrics.timed("music_listener_seconds", listener="track_end")
     async def on_wavelink_track_end(self, payload: TrackEventPayload):
         vc: wavelink.Player = payload.player 
+        if self.player_store:
+            self.player_store.mark(vc.guild.id)
 
         if vc.queue.is_empty:
+            self.dispatcher.clear_now_playing(vc.guild.id, delay=LONG_DELAY)
             return await vc.stop()
 
         if vc.queue.loop:
             await vc.queue.put_wait(payload.track)
 
-        next_up = vc.queue.get()
-
-        next_song: wavelink.abc.Playable | None = await next_up.search() if type(next_up).__name__ == "PartialTrack" else next_up
-        await vc.play(next_song)
-        embed = await vc.channel.send(embed=self.create_embed(next_song))
-        await embed.delete(delay=LONG_DELAY)
+        await self.play_next(vc.channel, vc)
 
     @_join.before_invoke
     @_play.before_invoke
@@ -287,3 +644,7 @@ class Music(commands.Cog):
                 return ':'.join(map(lambda n: f'{n:02}', duration)) # Converts all entries array into string and leftpads 2
             case "long":
                 return ', '.join(duration)
+
+
+def setup(bot: commands.Bot):
+    bot.add_cog(Music(bot))
@@ -0,0 +1,123 @@
+import asyncio
+import hashlib
+import os
+import shlex
+from collections import OrderedDict
+from pathlib import Path
+
+from loguru import logger
+
+
+AUDIO_CACHE_DIR = os.getenv("AUDIO_CACHE_DIR")
+AUDIO_CACHE_MAX_BYTES = int(os.getenv("AUDIO_CACHE_MAX_BYTES", 2 * 1024 ** 3))
+AUDIO_CACHE_TRANSCODES = int(os.getenv("AUDIO_CACHE_TRANSCODES", 2))
+# Longer songs would take up too much of the cache, and live streams never end
+AUDIO_CACHE_MAX_DURATION = int(os.getenv("AUDIO_CACHE_MAX_DURATION", 30 * 60))
+
+
+class AudioCache:
+    """Opus transcodes of played songs on disk, keyed by track and filter settings.
+
+    A miss transcodes the song in the background while it streams as usual, so the next
+    play of it reads a local file. Files are evicted least recently played first once
+    the directory goes over max_bytes.
+    """
+
+    def __init__(self, directory: str, max_bytes: int = AUDIO_CACHE_MAX_BYTES, transcodes: int = AUDIO_CACHE_TRANSCODES):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+
+        self._slots = asyncio.Semaphore(transcodes)
+        self._pending: dict[Path, asyncio.Task] = {}
+        self._sizes: OrderedDict[Path, int] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+        for leftover in self.directory.glob("*.part"):
+            leftover.unlink(missing_ok=True)
+
+        for path in sorted(self.directory.glob("*.ogg"), key=lambda path: path.stat().st_mtime):
+            self._sizes[path] = path.stat().st_size
+        self._evict()
+
+    @property
+    def size(self) -> int:
+        return sum(self._sizes.values())
+
+    @property
+    def stats(self) -> dict[str, int]:
+        return {"files": len(self._sizes), "bytes": self.size, "hits": self.hits, "misses": self.misses, "transcoding": len(self._pending)}
+
+    def path(self, track_id: str, filters: str) -> Path:
+        digest = hashlib.sha1(f"{track_id}\0{filters}".encode()).hexdigest()
+        return self.directory / f"{digest}.ogg"
+
+    def lookup(self, track_id: str, filters: str) -> Path | None:
+        path = self.path(track_id, filters)
+        if path not in self._sizes:
+            self.misses += 1
+            return None
+
+        try:
+            # mtime doubles as the last played time, so the LRU order survives restarts
+            os.utime(path)
+        except FileNotFoundError:
+            del self._sizes[path]
+            self.misses += 1
+            return None
+
+        self._sizes.move_to_end(path)
+        self.hits += 1
+        return path
+
+    def fill(self, track_id: str, filters: str, stream_url: str, *, before_options: str = ""):
+        """Starts transcoding a song into the cache unless it's already there or on its way."""
+        path = self.path(track_id, filters)
+        if path in self._sizes or path in self._pending:
+            return
+
+        task = asyncio.create_task(self._transcode(path, filters, stream_url, before_options))
+        self._pending[path] = task
+        task.add_done_callback(lambda _: self._pending.pop(path, None))
+
+    def close(self):
+        for task in self._pending.values():
+            task.cancel()
+
+    async def _transcode(self, path: Path, filters: str, stream_url: str, before_options: str):
+        part = path.with_suffix(".part")
+
+        async with self._slots:
+            process = await asyncio.create_subprocess_exec(
+                "ffmpeg", "-nostdin", "-loglevel", "error", *shlex.split(before_options),
+                "-i", stream_url, *shlex.split(filters),
+                "-c:a", "libopus", "-b:a", "128k", "-f", "ogg", "-y", str(part),
+                stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.PIPE,
+            )
+
+            try:
+                _, stderr = await process.communicate()
+            except asyncio.CancelledError:
+                process.kill()
+                part.unlink(missing_ok=True)
+                raise
+
+        if process.returncode != 0:
+            logger.warning(f"Couldn't transcode {stream_url} into the audio cache: {stderr.decode(errors='replace').strip()}")
+            part.unlink(missing_ok=True)
+            return
+
+        part.replace(path)
+        self._sizes[path] = path.stat().st_size
+        self._evict()
+
+    def _evict(self):
+        total = self.size
+        while total > self.max_bytes and self._sizes:
+            path, size = self._sizes.popitem(last=False)
+            path.unlink(missing_ok=True)
+            total -= size
+
+
+audio_cache = AudioCache(AUDIO_CACHE_DIR) if AUDIO_CACHE_DIR else None
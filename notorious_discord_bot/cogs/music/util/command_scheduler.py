@@ -0,0 +1,212 @@
+import asyncio
+import os
+import time
+from collections import Counter, OrderedDict, deque
+
+from discord.ext import commands
+
+
+SCHEDULER_CONCURRENCY = int(os.getenv("SCHEDULER_CONCURRENCY", 16))
+SCHEDULER_GUILD_CONCURRENCY = int(os.getenv("SCHEDULER_GUILD_CONCURRENCY", 2))
+SCHEDULER_USER_PENDING = int(os.getenv("SCHEDULER_USER_PENDING", 2))
+SCHEDULER_MAX_QUEUED = int(os.getenv("SCHEDULER_MAX_QUEUED", 200))
+SCHEDULER_GUILD_QUEUED = int(os.getenv("SCHEDULER_GUILD_QUEUED", 10))
+# Commands per second and burst size, per guild and per user
+SCHEDULER_GUILD_RATE = float(os.getenv("SCHEDULER_GUILD_RATE", 2))
+SCHEDULER_GUILD_BURST = int(os.getenv("SCHEDULER_GUILD_BURST", 10))
+SCHEDULER_USER_RATE = float(os.getenv("SCHEDULER_USER_RATE", 0.5))
+SCHEDULER_USER_BURST = int(os.getenv("SCHEDULER_USER_BURST", 5))
+
+
+class Overloaded(commands.CommandError):
+    """Raised instead of queueing a command that would only make everyone wait longer."""
+
+    def __init__(self, reason: str, message: str):
+        super().__init__(message)
+        self.reason = reason
+
+
+class TokenBucket:
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def take(self) -> bool:
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+    @property
+    def full(self) -> bool:
+        return self.tokens + (time.monotonic() - self.updated) * self.rate >= self.burst
+
+
+class Ticket:
+    __slots__ = ("guild_id", "user_id", "granted", "released")
+
+    def __init__(self, guild_id: int, user_id: int):
+        self.guild_id = guild_id
+        self.user_id = user_id
+        self.granted = False
+        self.released = False
+
+
+class CommandScheduler:
+    """Admission control and fair queueing for commands that do expensive work.
+
+    Every command spends a token from its guild's and its user's bucket. Commands that need a slot
+    wait in a queue per guild, and the guilds take turns round-robin, so one busy guild can't push
+    the others back. Past the rate limits or the queue limits the command is refused straight away.
+    """
+
+    def __init__(
+        self,
+        *,
+        concurrency: int = SCHEDULER_CONCURRENCY,
+        guild_concurrency: int = SCHEDULER_GUILD_CONCURRENCY,
+        user_pending: int = SCHEDULER_USER_PENDING,
+        max_queued: int = SCHEDULER_MAX_QUEUED,
+        guild_queued: int = SCHEDULER_GUILD_QUEUED,
+        guild_rate: float = SCHEDULER_GUILD_RATE,
+        guild_burst: int = SCHEDULER_GUILD_BURST,
+        user_rate: float = SCHEDULER_USER_RATE,
+        user_burst: int = SCHEDULER_USER_BURST,
+    ):
+        self.concurrency = concurrency
+        self.guild_concurrency = guild_concurrency
+        self.user_pending = user_pending
+        self.max_queued = max_queued
+        self.guild_queued = guild_queued
+        self.guild_rate, self.guild_burst = guild_rate, guild_burst
+        self.user_rate, self.user_burst = user_rate, user_burst
+
+        self.running = 0
+        self.queued = 0
+        self.admitted = 0
+        self.rejected: Counter = Counter()
+
+        self._guild_buckets: dict[int, TokenBucket] = {}
+        self._user_buckets: dict[int, TokenBucket] = {}
+        self._guild_running: Counter = Counter()
+        self._user_pending: Counter = Counter()
+        # Guilds with commands waiting, in the order they get their next turn
+        self._waiting: OrderedDict[int, deque[tuple[Ticket, asyncio.Future]]] = OrderedDict()
+
+    @property
+    def stats(self) -> dict[str, int]:
+        return {
+            "running": self.running,
+            "queued": self.queued,
+            "guilds_waiting": len(self._waiting),
+            "admitted": self.admitted,
+            **{f"rejected_{reason}": count for reason, count in self.rejected.items()},
+        }
+
+    def check_rate(self, guild_id: int, user_id: int):
+        """Spends a token for the guild and the user, refusing the command if either has run out."""
+        user_bucket = self._bucket(self._user_buckets, user_id, self.user_rate, self.user_burst)
+        if not user_bucket.take():
+            self._reject("user_rate", "You're sending commands a little fast, give it a few seconds and try again.")
+
+        guild_bucket = self._bucket(self._guild_buckets, guild_id, self.guild_rate, self.guild_burst)
+        if not guild_bucket.take():
+            self._reject("guild_rate", "This server is sending a lot of commands right now, try again in a few seconds.")
+
+    def check_capacity(self, guild_id: int, user_id: int):
+        """Refuses the command if the user, the guild or the scheduler as a whole can't queue any more."""
+        if self._user_pending[user_id] >= self.user_pending:
+            self._reject("user_pending", "Hang on, your last request is still being worked on.")
+        if self.queued >= self.max_queued:
+            self._reject("queue_full", "I'm really busy right now, please try again in a minute.")
+        if len(self._waiting.get(guild_id, ())) >= self.guild_queued:
+            self._reject("guild_queue_full", "This server already has a lot of requests waiting, try again once they're done.")
+
+    async def acquire(self, guild_id: int, user_id: int) -> Ticket:
+        """Waits for this guild's turn at a slot, refusing straight away when the queues are full."""
+        self.check_capacity(guild_id, user_id)
+
+        ticket = Ticket(guild_id, user_id)
+        future = asyncio.get_running_loop().create_future()
+        self._waiting.setdefault(guild_id, deque()).append((ticket, future))
+        self._user_pending[user_id] += 1
+        self.queued += 1
+        self.admitted += 1
+        self._dispatch()
+
+        try:
+            await future
+        except asyncio.CancelledError:
+            self.release(ticket)
+            raise
+        finally:
+            self.queued -= 1
+
+        return ticket
+
+    def release(self, ticket: Ticket):
+        if ticket.released:
+            return
+        ticket.released = True
+
+        self._decrement(self._user_pending, ticket.user_id)
+        if ticket.granted:
+            self.running -= 1
+            self._decrement(self._guild_running, ticket.guild_id)
+            self._dispatch()
+
+    def _dispatch(self):
+        granted = True
+        while granted and self.running < self.concurrency and self._waiting:
+            granted = False
+
+            # One turn per guild per pass, a guild that has used its turn goes to the back of the line
+            for guild_id in list(self._waiting):
+                if self.running >= self.concurrency:
+                    break
+                if self._guild_running[guild_id] >= self.guild_concurrency:
+                    continue
+
+                waiters = self._waiting[guild_id]
+                while waiters:
+                    ticket, future = waiters.popleft()
+                    if not future.done():
+                        ticket.granted = True
+                        self.running += 1
+                        self._guild_running[guild_id] += 1
+                        future.set_result(None)
+                        granted = True
+                        break
+
+                if waiters:
+                    self._waiting.move_to_end(guild_id)
+                else:
+                    del self._waiting[guild_id]
+
+    def _bucket(self, buckets: dict[int, TokenBucket], key: int, rate: float, burst: int) -> TokenBucket:
+        if (bucket := buckets.get(key)) is None:
+            # Full buckets hold nothing a fresh one wouldn't, so clear them out before they pile up
+            if len(buckets) >= 10_000:
+                for stale in [key for key, bucket in buckets.items() if bucket.full]:
+                    del buckets[stale]
+            bucket = buckets[key] = TokenBucket(rate, burst)
+
+        return bucket
+
+    def _reject(self, reason: str, message: str):
+        self.rejected[reason] += 1
+        raise Overloaded(reason, message)
+
+    @staticmethod
+    def _decrement(counter: Counter, key: int):
+        counter[key] -= 1
+        if counter[key] <= 0:
+            del counter[key]
@@ -0,0 +1,32 @@
+from collections import OrderedDict
+from typing import Any, Callable
+
+import discord
+
+
+class EmbedCache:
+    """Keeps the rendered, static part of track embeds so each track is only rendered once.
+
+    Callers get a fresh Embed built from the cached payload and add their dynamic fields to it.
+    """
+
+    def __init__(self, max_size: int = 1024):
+        self.max_size = max_size
+        self._payloads: OrderedDict[str, dict[str, Any]] = OrderedDict()
+
+    def __len__(self):
+        return len(self._payloads)
+
+    def get(self, key: str, render: Callable[[], discord.Embed]) -> discord.Embed:
+        payload = self._payloads.get(key)
+
+        if payload is None:
+            payload = render().to_dict()
+            self._payloads[key] = payload
+            if len(self._payloads) > self.max_size:
+                self._payloads.popitem(last=False)
+        else:
+            self._payloads.move_to_end(key)
+
+        # from_dict gives every caller its own field list, so adding fields never touches the cache
+        return discord.Embed.from_dict(payload)
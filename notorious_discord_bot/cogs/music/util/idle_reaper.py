@@ -0,0 +1,133 @@
+import asyncio
+import os
+import time
+from typing import Awaitable, Callable, NamedTuple
+
+from loguru import logger
+
+
+REAPER_IDLE_TIMEOUT = float(os.getenv("REAPER_IDLE_TIMEOUT", 180))
+REAPER_EMPTY_TIMEOUT = float(os.getenv("REAPER_EMPTY_TIMEOUT", 60))
+REAPER_INTERVAL = float(os.getenv("REAPER_INTERVAL", 15))
+REAPER_BATCH_SIZE = int(os.getenv("REAPER_BATCH_SIZE", 25))
+# Past this many players, idle ones are reaped straight away, longest idle first
+REAPER_MAX_PLAYERS = int(os.getenv("REAPER_MAX_PLAYERS", 1000))
+
+
+class PlayerUsage(NamedTuple):
+    playing: bool
+    listeners: int
+    queued: int
+
+
+class _Tracked:
+    __slots__ = ("probe", "close", "idle_since", "empty_since", "usage")
+
+    def __init__(self, probe: Callable[[], PlayerUsage], close: Callable[[], Awaitable[None]]):
+        self.probe = probe
+        self.close = close
+        self.idle_since: float | None = None
+        self.empty_since: float | None = None
+        self.usage = PlayerUsage(False, 0, 0)
+
+
+class IdleReaper:
+    """Disconnects players that have sat idle or alone in their channel for too long.
+
+    Players are checked every `interval` seconds and closed at most `batch_size` at a time,
+    so a burst of expiring players doesn't turn into a burst of gateway and Lavalink calls.
+    """
+
+    def __init__(
+        self,
+        *,
+        idle_timeout: float = REAPER_IDLE_TIMEOUT,
+        empty_timeout: float = REAPER_EMPTY_TIMEOUT,
+        interval: float = REAPER_INTERVAL,
+        batch_size: int = REAPER_BATCH_SIZE,
+        max_players: int = REAPER_MAX_PLAYERS,
+    ):
+        self.idle_timeout = idle_timeout
+        self.empty_timeout = empty_timeout
+        self.interval = interval
+        self.batch_size = batch_size
+        self.max_players = max_players
+
+        self.reaped = 0
+        self._players: dict[int, _Tracked] = {}
+        self._task: asyncio.Task | None = None
+
+    def __contains__(self, guild_id: int):
+        return guild_id in self._players
+
+    @property
+    def stats(self) -> dict[str, int]:
+        return {
+            "live": len(self._players),
+            "idle": sum(1 for tracked in self._players.values() if tracked.idle_since is not None),
+            "empty": sum(1 for tracked in self._players.values() if tracked.empty_since is not None),
+            "queued": sum(tracked.usage.queued for tracked in self._players.values()),
+            "reaped": self.reaped,
+        }
+
+    def track(self, guild_id: int, probe: Callable[[], PlayerUsage], close: Callable[[], Awaitable[None]]):
+        """Watches a guild's player, probe reports how it's being used and close tears it down."""
+        self._players[guild_id] = _Tracked(probe, close)
+
+        if not self._task or self._task.done():
+            self._task = asyncio.create_task(self._sweep_loop())
+
+    def forget(self, guild_id: int):
+        self._players.pop(guild_id, None)
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    async def sweep(self) -> int:
+        now = time.monotonic()
+        expired = []
+        idle = []
+
+        for guild_id, tracked in list(self._players.items()):
+            try:
+                tracked.usage = usage = tracked.probe()
+            except Exception as e:
+                logger.warning(f"Couldn't check player for guild {guild_id}, reaping it: {e}")
+                expired.append(guild_id)
+                continue
+
+            tracked.idle_since = None if usage.playing else tracked.idle_since or now
+            tracked.empty_since = None if usage.listeners else tracked.empty_since or now
+
+            if tracked.empty_since is not None and now - tracked.empty_since >= self.empty_timeout:
+                expired.append(guild_id)
+            elif tracked.idle_since is not None:
+                if now - tracked.idle_since >= self.idle_timeout:
+                    expired.append(guild_id)
+                else:
+                    idle.append(guild_id)
+
+        if (excess := len(self._players) - len(expired) - self.max_players) > 0:
+            idle.sort(key=lambda guild_id: self._players[guild_id].idle_since)
+            expired += idle[:excess]
+
+        batch = expired[:self.batch_size]
+        closes = [self._players.pop(guild_id).close() for guild_id in batch]
+        for guild_id, result in zip(batch, await asyncio.gather(*closes, return_exceptions=True)):
+            if isinstance(result, Exception):
+                logger.warning(f"Error while reaping player for guild {guild_id}: {result}")
+
+        if batch:
+            self.reaped += len(batch)
+            logger.info(f"Reaped {len(batch)} idle players {self.stats}")
+        return len(batch)
+
+    async def _sweep_loop(self):
+        while self._players:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.sweep()
+            except Exception as e:
+                logger.error(f"Idle player sweep failed: {e}")
@@ -0,0 +1,209 @@
+from bisect import bisect_right
+from collections import Counter
+from itertools import chain, islice
+from typing import Any, Callable, Hashable, Iterable
+
+
+class IndexedList:
+    """A deque-like sequence split into blocks, for queues that get paged through and edited.
+
+    Locating an index is a binary search over the block offsets and inserting or removing
+    only shifts items inside one block, so paging, remove-at and move cost O(n / BLOCK_SIZE)
+    at worst instead of the O(n) a deque needs for anything away from its ends.
+    When a key function is given, a count of keys is kept so membership and dedup checks are O(1).
+    """
+
+    BLOCK_SIZE = 256
+
+    def __init__(self, iterable: Iterable = (), *, key: Callable[[Any], Hashable] | None = None):
+        self.key = key
+
+        self._blocks: list[list] = []
+        self._offsets: list[int] = []
+        self._dirty = False
+        self._len = 0
+        self._keys: Counter = Counter()
+
+        self.extend(iterable)
+
+    def __len__(self):
+        return self._len
+
+    def __bool__(self):
+        return self._len > 0
+
+    def __iter__(self):
+        return chain.from_iterable(self._blocks)
+
+    def __reversed__(self):
+        return chain.from_iterable(reversed(block) for block in reversed(self._blocks))
+
+    def __contains__(self, item):
+        if self.key:
+            return self._keys[self.key(item)] > 0
+        return any(item in block for block in self._blocks)
+
+    def __getitem__(self, index: int | slice):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self._len)
+            if step != 1:
+                return list(self)[index]
+            return self.page(start, stop)
+
+        block, offset = self._locate(index)
+        return self._blocks[block][offset]
+
+    def __setitem__(self, index: int, item):
+        block, offset = self._locate(index)
+        self._forget(self._blocks[block][offset])
+        self._blocks[block][offset] = item
+        self._remember(item)
+
+    def __delitem__(self, index: int):
+        self.pop_at(index)
+
+    def __copy__(self):
+        return self.copy()
+
+    def __repr__(self):
+        return f"IndexedList({list(self)!r})"
+
+    def copy(self) -> "IndexedList":
+        return IndexedList(self, key=self.key)
+
+    def page(self, start: int, stop: int) -> list:
+        """Returns the items between start and stop without walking the ones before them."""
+        start, stop = max(start, 0), min(stop, self._len)
+        if start >= stop:
+            return []
+
+        block, offset = self._locate(start)
+        items = chain(islice(self._blocks[block], offset, None), chain.from_iterable(self._blocks[block + 1:]))
+        return list(islice(items, stop - start))
+
+    def append(self, item):
+        if not self._blocks or len(self._blocks[-1]) >= self.BLOCK_SIZE:
+            self._blocks.append([])
+            self._dirty = True
+        self._blocks[-1].append(item)
+        self._added(item)
+
+    def appendleft(self, item):
+        self.insert(0, item)
+
+    def extend(self, iterable: Iterable):
+        for item in iterable:
+            self.append(item)
+
+    def insert(self, index: int, item):
+        if index < 0:
+            index = max(self._len + index, 0)
+        if index >= self._len:
+            return self.append(item)
+
+        block, offset = self._locate(index)
+        self._blocks[block].insert(offset, item)
+
+        if len(self._blocks[block]) > 2 * self.BLOCK_SIZE:
+            half = self._blocks[block][self.BLOCK_SIZE:]
+            del self._blocks[block][self.BLOCK_SIZE:]
+            self._blocks.insert(block + 1, half)
+
+        self._added(item)
+
+    def pop_at(self, index: int):
+        block, offset = self._locate(index)
+        item = self._blocks[block].pop(offset)
+
+        if not self._blocks[block]:
+            del self._blocks[block]
+
+        self._removed(item)
+        return item
+
+    def pop(self):
+        if not self._len:
+            raise IndexError("pop from an empty IndexedList")
+        return self.pop_at(self._len - 1)
+
+    def popleft(self):
+        if not self._len:
+            raise IndexError("pop from an empty IndexedList")
+        return self.pop_at(0)
+
+    def move(self, source: int, destination: int):
+        """Moves the item at source so it ends up at index destination."""
+        self.insert(destination, self.pop_at(source))
+
+    def index(self, item) -> int:
+        for i, other in enumerate(self):
+            if other == item:
+                return i
+        raise ValueError(f"{item!r} is not in IndexedList")
+
+    def remove(self, item):
+        self.pop_at(self.index(item))
+
+    def count_key(self, key: Hashable) -> int:
+        return self._keys[key]
+
+    def dedup(self) -> int:
+        """Drops every item whose key was already seen earlier in the list, returns how many were removed."""
+        if not self.key or all(count == 1 for count in self._keys.values()):
+            return 0
+
+        seen = set()
+        kept = []
+        for item in self:
+            key = self.key(item)
+            if key not in seen:
+                seen.add(key)
+                kept.append(item)
+
+        removed = self._len - len(kept)
+        self.clear()
+        self.extend(kept)
+        return removed
+
+    def clear(self):
+        self._blocks.clear()
+        self._offsets.clear()
+        self._keys.clear()
+        self._dirty = False
+        self._len = 0
+
+    def _locate(self, index: int) -> tuple[int, int]:
+        if index < 0:
+            index += self._len
+        if not 0 <= index < self._len:
+            raise IndexError("IndexedList index out of range")
+
+        if self._dirty:
+            self._offsets = [0] * len(self._blocks)
+            for i in range(1, len(self._blocks)):
+                self._offsets[i] = self._offsets[i - 1] + len(self._blocks[i - 1])
+            self._dirty = False
+
+        block = bisect_right(self._offsets, index) - 1
+        return block, index - self._offsets[block]
+
+    def _added(self, item):
+        self._len += 1
+        self._dirty = True
+        self._remember(item)
+
+    def _removed(self, item):
+        self._len -= 1
+        self._dirty = True
+        self._forget(item)
+
+    def _remember(self, item):
+        if self.key:
+            self._keys[self.key(item)] += 1
+
+    def _forget(self, item):
+        if self.key:
+            key = self.key(item)
+            self._keys[key] -= 1
+            if not self._keys[key]:
+                del self._keys[key]
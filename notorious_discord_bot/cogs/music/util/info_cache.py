@@ -0,0 +1,76 @@
+import time
+from collections import OrderedDict
+
+from notorious_discord_bot.cogs.music.util.query_key import normalize
+from notorious_discord_bot.cogs.music.util.track_info import TrackInfo
+
+
+# Refresh stream URLs a bit before they actually expire so a song doesn't die halfway through
+EXPIRY_MARGIN = 10 * 60
+
+
+class InfoCache:
+    """Tracks extracted by youtube_dl, found by their webpage URL or by any search that led to them.
+
+    Entries go stale when their stream URL expires, stale entries are still returned so the
+    caller knows which page to re-extract without resolving the search again. That is still a
+    full extraction of the page, youtube_dl has no way to refresh only the stream URL.
+    """
+
+    def __init__(self, max_size: int = 1024, ttl: float = 6 * 60 * 60):
+        self.max_size = max_size
+        self.ttl = ttl
+
+        self._infos: OrderedDict[str, tuple[float, TrackInfo]] = OrderedDict()
+        self._aliases: OrderedDict[str, str] = OrderedDict()
+        self.hits = 0
+        self.stale = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._infos)
+
+    @property
+    def stats(self) -> dict[str, int]:
+        return {"size": len(self._infos), "hits": self.hits, "stale": self.stale, "misses": self.misses}
+
+    def get(self, search: str) -> tuple[TrackInfo | None, bool]:
+        """Returns the cached info for a search or URL and whether its stream URL is still fresh."""
+        key = normalize(search)
+        url = self._aliases.get(key, key)
+
+        entry = self._infos.get(url)
+        if entry is None:
+            self.misses += 1
+            return None, False
+
+        self._infos.move_to_end(url)
+        if key in self._aliases:
+            self._aliases.move_to_end(key)
+
+        expires, info = entry
+        if expires < time.time():
+            self.stale += 1
+            return info, False
+
+        self.hits += 1
+        return info, True
+
+    def put(self, search: str, info: TrackInfo):
+        url = normalize(info.uri)
+
+        expires = time.time() + self.ttl
+        if info.expires is not None:
+            expires = min(expires, info.expires - EXPIRY_MARGIN)
+
+        self._infos[url] = (expires, info)
+        self._infos.move_to_end(url)
+        while len(self._infos) > self.max_size:
+            self._infos.popitem(last=False)
+
+        if (key := normalize(search)) != url:
+            self._aliases[key] = url
+            self._aliases.move_to_end(key)
+            # Aliases to evicted pages just miss, so they only need a loose bound
+            while len(self._aliases) > 4 * self.max_size:
+                self._aliases.popitem(last=False)
@@ -0,0 +1,155 @@
+import asyncio
+import os
+import signal
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from datetime import datetime
+from typing import NamedTuple
+
+from loguru import logger
+
+from notorious_discord_bot.cogs.music.util.metrics import metrics
+
+
+LOOP_WATCHDOG = os.getenv("LOOP_WATCHDOG", "").lower() in ("1", "true")
+LOOP_WATCHDOG_THRESHOLD = float(os.getenv("LOOP_WATCHDOG_THRESHOLD", 0.1))
+LOOP_WATCHDOG_INTERVAL = float(os.getenv("LOOP_WATCHDOG_INTERVAL", 0.05))
+LOOP_WATCHDOG_EVENTS = int(os.getenv("LOOP_WATCHDOG_EVENTS", 100))
+STACK_DEPTH = 25
+
+# Frames from the cogs are the ones worth naming, everything above them is py-cord and asyncio
+COGS_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class SlowEvent(NamedTuple):
+    at: float
+    duration: float
+    where: str
+    task: str
+    stack: str
+
+    def format(self) -> str:
+        when = datetime.fromtimestamp(self.at).isoformat(timespec="milliseconds")
+        return f"{when} loop blocked {self.duration * 1000:.0f}ms in {self.where} (task {self.task})\n{self.stack}"
+
+
+def culprit(frame) -> str:
+    """The outermost function of ours on the stack, which is the command or listener that's running."""
+    found = "unknown"
+    while frame is not None:
+        code = frame.f_code
+        # Skip decorator wrappers so a timed listener shows up under its own name
+        if code.co_filename.startswith(COGS_DIR) and "<locals>" not in code.co_qualname:
+            found = code.co_qualname
+        frame = frame.f_back
+
+    return found
+
+
+class LoopWatchdog:
+    """Measures event loop lag and records what was running whenever the loop stalls.
+
+    A heartbeat task on the loop wakes every `interval`, a thread checks on it and, once it's late
+    by more than `threshold`, grabs the loop thread's stack while the blocking code is still on it.
+    The last `capacity` slow events are kept and logged on SIGUSR1 or by calling dump().
+    """
+
+    def __init__(
+        self,
+        *,
+        threshold: float = LOOP_WATCHDOG_THRESHOLD,
+        interval: float = LOOP_WATCHDOG_INTERVAL,
+        capacity: int = LOOP_WATCHDOG_EVENTS,
+    ):
+        self.threshold = threshold
+        self.interval = interval
+        self.events: deque[SlowEvent] = deque(maxlen=capacity)
+
+        self._beat = time.monotonic()
+        self._stall: tuple[float, str, str, str] | None = None
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._loop_thread: int | None = None
+        self._task: asyncio.Task | None = None
+
+    def start(self):
+        if self._task:
+            return
+
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self._beat = time.monotonic()
+        self._stopped.clear()
+        self._task = self._loop.create_task(self._heartbeat())
+        threading.Thread(target=self._watch, name="loop-watchdog", daemon=True).start()
+
+        try:
+            self._loop.add_signal_handler(signal.SIGUSR1, self.dump)
+        except (NotImplementedError, AttributeError, RuntimeError):
+            # No SIGUSR1 on Windows, dump() can still be called directly
+            pass
+
+        logger.info(f"Watching the event loop for stalls over {self.threshold * 1000:.0f}ms")
+
+    def stop(self):
+        self._stopped.set()
+        if self._task:
+            self._task.cancel()
+            self._task = None
+            try:
+                self._loop.remove_signal_handler(signal.SIGUSR1)
+            except (NotImplementedError, AttributeError, RuntimeError):
+                pass
+
+    def dump(self) -> str:
+        report = "\n".join(event.format() for event in self.events) or "No slow event loop callbacks recorded"
+        logger.warning(f"{len(self.events)} slow event loop callbacks:\n{report}")
+        return report
+
+    async def _heartbeat(self):
+        while True:
+            before = self._beat
+            await asyncio.sleep(self.interval)
+            now = self._beat = time.monotonic()
+
+            lag = max(now - before - self.interval, 0.0)
+            metrics.observe("event_loop_lag_seconds", lag)
+
+            with self._lock:
+                stall, self._stall = self._stall, None
+            if lag < self.threshold:
+                continue
+
+            metrics.inc("event_loop_stalls_total")
+            # A stall shorter than the watch interval can end before the thread sees it, there's no stack then
+            _, where, task, stack = stall if stall and stall[0] == before else (None, "unknown", "unknown", "")
+            self.events.append(SlowEvent(time.time() - lag, lag, where, task, stack))
+            logger.warning(f"Event loop blocked for {lag * 1000:.0f}ms in {where}")
+
+    def _watch(self):
+        while not self._stopped.wait(self.interval / 2):
+            beat = self._beat
+            if time.monotonic() - beat < self.interval + self.threshold:
+                continue
+
+            with self._lock:
+                if self._stall and self._stall[0] == beat:
+                    continue
+
+            frame = sys._current_frames().get(self._loop_thread)
+            if frame is None:
+                continue
+
+            task = asyncio.current_task(self._loop)
+            stall = (beat, culprit(frame), task.get_name() if task else "callback", "".join(traceback.format_stack(frame, limit=STACK_DEPTH)))
+            del frame
+
+            with self._lock:
+                self._stall = stall
+
+
+watchdog = LoopWatchdog()
@@ -0,0 +1,224 @@
+import asyncio
+import heapq
+import itertools
+import time
+from collections import defaultdict
+
+import discord
+from loguru import logger
+
+
+MAX_MESSAGE_LENGTH = 2000
+BULK_DELETE_LIMIT = 100
+# How long unloading waits on deletions that were still pending
+CLOSE_TIMEOUT = 5.0
+
+
+class MessageDispatcher:
+    """Coalesces the music cog's chat messages into as few Discord API calls as possible.
+
+    Messages sent to a channel within `window` seconds of each other are merged into one,
+    each guild keeps a single now playing message that gets edited on track changes and
+    deletions are swept up in batches every `sweep_interval` seconds.
+    """
+
+    def __init__(self, window: float = 0.5, sweep_interval: float = 2.0):
+        self.window = window
+        self.sweep_interval = sweep_interval
+
+        self.calls = 0
+        self.saved = 0
+
+        self._outbox: dict[int, list[tuple[str, float | None]]] = defaultdict(list)
+        self._flushes: dict[int, asyncio.Task] = {}
+
+        self._now_playing: dict[int, discord.Message] = {}
+        self._pending_now_playing: dict[int, tuple[discord.abc.Messageable, discord.Embed]] = {}
+        self._now_playing_flushes: dict[int, asyncio.Task] = {}
+
+        self._deletions: list[tuple[float, int, discord.Message | discord.Interaction]] = []
+        self._counter = itertools.count()
+        self._sweeper: asyncio.Task | None = None
+        self._closing: asyncio.Task | None = None
+        self._wake = asyncio.Event()
+
+    @property
+    def stats(self) -> dict[str, int]:
+        return {"calls": self.calls, "saved": self.saved, "pending_deletions": len(self._deletions)}
+
+    def send(self, channel: discord.abc.Messageable, content: str, *, delete_after: float | None = None):
+        """Queues a message for the channel, merging it with anything else sent in the same window."""
+        self._outbox[channel.id].append((content, delete_after))
+
+        if channel.id not in self._flushes:
+            self._flushes[channel.id] = asyncio.create_task(self._flush(channel))
+
+    def now_playing(self, guild_id: int, channel: discord.abc.Messageable, embed: discord.Embed):
+        """Shows the embed in the guild's now playing message, only the last one in a window is sent."""
+        self._pending_now_playing[guild_id] = (channel, embed)
+
+        if guild_id in self._now_playing_flushes:
+            self.saved += 1
+        else:
+            self._now_playing_flushes[guild_id] = asyncio.create_task(self._flush_now_playing(guild_id))
+
+    def clear_now_playing(self, guild_id: int, *, delay: float = 0.0):
+        self._pending_now_playing.pop(guild_id, None)
+        if task := self._now_playing_flushes.pop(guild_id, None):
+            task.cancel()
+
+        if message := self._now_playing.pop(guild_id, None):
+            self.delete_later(message, delay)
+
+    def delete_later(self, target: discord.Message | discord.Interaction, delay: float):
+        """Deletes a message, or an interaction's original response, once the delay has passed."""
+        deadline = time.monotonic() + delay
+        if self._deletions and deadline < self._deletions[0][0]:
+            self._wake.set()
+        heapq.heappush(self._deletions, (deadline, next(self._counter), target))
+
+        if not self._sweeper or self._sweeper.done():
+            self._sweeper = asyncio.create_task(self._sweep())
+
+    def close(self, timeout: float = CLOSE_TIMEOUT) -> asyncio.Task | None:
+        """Stops batching, messages still due to be deleted are deleted now, for up to `timeout` seconds."""
+        for task in itertools.chain(self._flushes.values(), self._now_playing_flushes.values(), [self._sweeper]):
+            if task:
+                task.cancel()
+        self._sweeper = None
+
+        if not self._deletions:
+            return None
+
+        due = [target for _, _, target in sorted(self._deletions)]
+        self._deletions.clear()
+        self._closing = asyncio.create_task(self._delete_before_close(due, timeout))
+        return self._closing
+
+    async def _delete_before_close(self, due: list[discord.Message | discord.Interaction], timeout: float):
+        try:
+            await asyncio.wait_for(self._delete_due(due), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Gave up on deleting messages after {timeout}s while closing")
+
+    async def _flush(self, channel: discord.abc.Messageable):
+        await asyncio.sleep(self.window)
+
+        del self._flushes[channel.id]
+        batch = self._outbox.pop(channel.id, [])
+
+        chunks = [""]
+        for content, _ in batch:
+            if len(chunks[-1]) + len(content) + 1 > MAX_MESSAGE_LENGTH:
+                chunks.append("")
+            chunks[-1] = f"{chunks[-1]}\n{content}" if chunks[-1] else content
+
+        delays = [delay for _, delay in batch if delay is not None]
+        self.saved += len(batch) - len(chunks)
+
+        for chunk in chunks:
+            try:
+                message = await channel.send(chunk)
+            except discord.HTTPException as e:
+                logger.warning(f"Couldn't send message to channel {channel.id}: {e}")
+                continue
+            finally:
+                self.calls += 1
+
+            if delays:
+                self.delete_later(message, max(delays))
+
+    async def _flush_now_playing(self, guild_id: int):
+        await asyncio.sleep(self.window)
+
+        del self._now_playing_flushes[guild_id]
+        channel, embed = self._pending_now_playing.pop(guild_id)
+        message = self._now_playing.get(guild_id)
+
+        if message and message.channel.id == channel.id:
+            try:
+                await message.edit(embed=embed)
+                # An edit stands in for sending a new message and deleting the old one
+                self.saved += 1
+                return
+            except discord.NotFound:
+                pass
+            except discord.HTTPException as e:
+                logger.warning(f"Couldn't edit now playing message in guild {guild_id}: {e}")
+                self.delete_later(message, 0.0)
+            finally:
+                self.calls += 1
+        elif message:
+            self.delete_later(message, 0.0)
+
+        try:
+            self._now_playing[guild_id] = await channel.send(embed=embed)
+        except discord.HTTPException as e:
+            logger.warning(f"Couldn't send now playing message in guild {guild_id}: {e}")
+            self._now_playing.pop(guild_id, None)
+        finally:
+            self.calls += 1
+
+    async def _sweep(self):
+        while self._deletions:
+            self._wake.clear()
+            delay = self._deletions[0][0] - time.monotonic()
+            if delay > 0:
+                # Give deletions that are due around the same time a chance to join the batch
+                try:
+                    await asyncio.wait_for(self._wake.wait(), delay + self.sweep_interval)
+                    continue
+                except asyncio.TimeoutError:
+                    pass
+
+            due = []
+            now = time.monotonic()
+            while self._deletions and self._deletions[0][0] <= now:
+                due.append(heapq.heappop(self._deletions)[2])
+
+            await self._delete_due(due)
+
+    async def _delete_due(self, due: list[discord.Message | discord.Interaction]):
+        by_channel: dict[int, list[discord.Message]] = defaultdict(list)
+        for target in due:
+            if isinstance(target, discord.Interaction):
+                await self._delete(target.delete_original_response())
+            else:
+                by_channel[target.channel.id].append(target)
+
+        for messages in by_channel.values():
+            await self._delete_messages(messages)
+
+    async def _delete_messages(self, messages: list[discord.Message]):
+        channel = messages[0].channel
+        guild = getattr(channel, "guild", None)
+        can_bulk = (
+            len(messages) > 1
+            and hasattr(channel, "delete_messages")
+            and guild is not None
+            and channel.permissions_for(guild.me).manage_messages
+        )
+
+        if not can_bulk:
+            for message in messages:
+                await self._delete(message.delete())
+            return
+
+        for start in range(0, len(messages), BULK_DELETE_LIMIT):
+            chunk = messages[start:start + BULK_DELETE_LIMIT]
+            if len(chunk) == 1:
+                await self._delete(chunk[0].delete())
+                continue
+
+            await self._delete(channel.delete_messages(chunk))
+            self.saved += len(chunk) - 1
+
+    async def _delete(self, request):
+        try:
+            await request
+        except discord.NotFound:
+            pass
+        except discord.HTTPException as e:
+            logger.warning(f"Couldn't delete message: {e}")
+        finally:
+            self.calls += 1
@@ -0,0 +1,162 @@
+import asyncio
+import functools
+import os
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable
+
+from loguru import logger
+
+
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT")) if os.getenv("METRICS_PORT") else None
+
+# Latency buckets in seconds, from a regex match up to a slow Lavalink search
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _labels(labels: dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels.items()) + "}"
+
+
+class Histogram:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Registry:
+    """Counters, gauges and latency histograms, rendered in the Prometheus text format.
+
+    Recording only touches a few numbers, all the formatting happens when the endpoint is
+    scraped and gauges are only read then, so nothing is spent on metrics no one looks at.
+    """
+
+    def __init__(self):
+        self._help: dict[str, tuple[str, str]] = {}
+        self._counters: dict[str, dict[tuple, float]] = {}
+        self._histograms: dict[str, dict[tuple, Histogram]] = {}
+        self._gauges: dict[str, tuple[Callable[[], float | dict[str, float]], str]] = {}
+        self._server: asyncio.AbstractServer | None = None
+
+    def inc(self, name: str, amount: float = 1, **labels: str):
+        series = self._counters.setdefault(name, {})
+        key = tuple(labels.items())
+        series[key] = series.get(key, 0) + amount
+
+    def observe(self, name: str, value: float, **labels: str):
+        series = self._histograms.setdefault(name, {})
+        key = tuple(labels.items())
+        if (histogram := series.get(key)) is None:
+            histogram = series[key] = Histogram()
+        histogram.observe(value)
+
+    def gauge(self, name: str, read: Callable[[], float | dict[str, float]], description: str = "", label: str = "stat"):
+        """Registers a gauge read at scrape time, a dict result becomes one series per key, under `label`."""
+        self._gauges[name] = (read, label)
+        self.describe(name, "gauge", description)
+
+    def describe(self, name: str, kind: str, description: str):
+        self._help[name] = (kind, description)
+
+    @contextmanager
+    def timer(self, name: str, **labels: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def timed(self, name: str, **labels: str):
+        """Decorates a coroutine function to record how long each call takes."""
+        def decorator(func):
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                with self.timer(name, **labels):
+                    return await func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def render(self) -> str:
+        lines = []
+
+        for name, series in self._counters.items():
+            lines += self._header(name, "counter")
+            lines += [f"{name}{_labels(dict(key))} {value}" for key, value in series.items()]
+
+        for name, series in self._histograms.items():
+            lines += self._header(name, "histogram")
+            for key, histogram in series.items():
+                labels = dict(key)
+                total = 0
+                for bound, count in zip(BUCKETS, histogram.counts):
+                    total += count
+                    lines.append(f"{name}_bucket{_labels({**labels, 'le': str(bound)})} {total}")
+                lines.append(f"{name}_bucket{_labels({**labels, 'le': '+Inf'})} {histogram.count}")
+                lines.append(f"{name}_sum{_labels(labels)} {histogram.sum}")
+                lines.append(f"{name}_count{_labels(labels)} {histogram.count}")
+
+        for name, (read, label) in self._gauges.items():
+            try:
+                value = read()
+            except Exception as e:
+                logger.warning(f"Couldn't read gauge {name}: {e}")
+                continue
+
+            lines += self._header(name, "gauge")
+            if isinstance(value, dict):
+                lines += [f"{name}{_labels({label: key})} {stat}" for key, stat in value.items()]
+            else:
+                lines.append(f"{name} {value}")
+
+        return "\n".join(lines) + "\n"
+
+    async def serve(self, port: int, host: str = METRICS_HOST):
+        if self._server:
+            return
+
+        self._server = await asyncio.start_server(self._handle, host, port)
+        logger.info(f"Serving metrics on http://{host}:{port}/metrics")
+
+    def close(self):
+        if self._server:
+            self._server.close()
+            self._server = None
+
+    def _header(self, name: str, kind: str) -> list[str]:
+        kind, description = self._help.get(name, (kind, ""))
+        return [f"# HELP {name} {description}", f"# TYPE {name} {kind}"] if description else [f"# TYPE {name} {kind}"]
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), 5)
+            path = request.split(b" ", 2)[1] if request.count(b" ") >= 2 else b""
+
+            if path == b"/metrics":
+                status, body = "200 OK", self.render().encode()
+            else:
+                status, body = "404 Not Found", b"Not found\n"
+
+            writer.write(
+                f"HTTP/1.1 {status}\r\nContent-Type: text/plain; version=0.0.4\r\n"
+                f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body
+            )
+            await writer.drain()
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+metrics = Registry()
@@ -0,0 +1,116 @@
+import asyncio
+from typing import Any
+
+import wavelink
+from loguru import logger
+from wavelink import NodeStatus
+
+
+def parse_nodes(spec: str, password: str | None) -> list[wavelink.Node]:
+    """Builds nodes from a comma separated list of URIs, each optionally suffixed with #password."""
+    nodes = []
+    for entry in filter(None, (part.strip() for part in spec.split(","))):
+        uri, _, node_password = entry.partition("#")
+        nodes.append(wavelink.Node(id=uri, uri=uri, password=node_password or password))
+
+    return nodes
+
+
+def penalty(stats: dict[str, Any]) -> float:
+    """Lavalink's load balancing penalty for a node, lower is better."""
+    players = stats.get("playingPlayers", 0)
+    cpu = 1.05 ** (100 * stats.get("cpu", {}).get("systemLoad", 0)) * 10 - 10
+
+    frames = stats.get("frameStats") or {}
+    deficit = 1.03 ** (500 * frames.get("deficit", 0) / 3000) * 600 - 600
+    nulled = (1.03 ** (500 * frames.get("nulled", 0) / 3000) * 300 - 300) * 2
+
+    return players + cpu + deficit + nulled
+
+
+class NodeBalancer:
+    """Places players on the least loaded Lavalink node and keeps their failover order current."""
+
+    def __init__(self, interval: float = 30.0, player_cls: type[wavelink.Player] = wavelink.Player):
+        self.interval = interval
+        self.player_cls = player_cls
+
+        self._stats: dict[str, dict[str, Any]] = {}
+        self._placements: dict[int, str] = {}
+        self._task: asyncio.Task | None = None
+
+    def start(self):
+        if not self._task:
+            self._task = asyncio.create_task(self._refresh_loop())
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    def load(self, node: wavelink.Node) -> float:
+        if stats := self._stats.get(node.id):
+            return penalty(stats)
+
+        return len(node.players)
+
+    def ranked(self) -> list[wavelink.Node]:
+        """Connected nodes, least loaded first."""
+        nodes = [node for node in wavelink.NodePool.nodes.values() if node.status is NodeStatus.CONNECTED]
+        if not nodes:
+            raise wavelink.InvalidNode("There are no connected Lavalink nodes.")
+
+        return sorted(nodes, key=self.load)
+
+    def best(self) -> wavelink.Node:
+        return self.ranked()[0]
+
+    def create_player(self, client, channel) -> wavelink.Player:
+        """Used as the cls when connecting to voice, so new players land on the best node."""
+        return self.player_cls(client, channel, nodes=self.ranked())
+
+    async def refresh(self):
+        for node in wavelink.NodePool.nodes.values():
+            if node.status is not NodeStatus.CONNECTED:
+                self._stats.pop(node.id, None)
+                continue
+
+            try:
+                self._stats[node.id] = await node._send(method="GET", path="stats")
+            except Exception as e:
+                logger.warning(f"Couldn't fetch stats from Lavalink node <{node.id}>: {e}")
+                self._stats.pop(node.id, None)
+
+        try:
+            ranked = self.ranked()
+        except wavelink.InvalidNode:
+            return
+
+        for node in ranked:
+            for guild_id, player in list(node.players.items()):
+                # wavelink swaps a player onto the first connected node in this list when its node drops
+                player.nodes = ranked
+
+                if self._placements.get(guild_id, node.id) != node.id:
+                    await self._restore(player)
+                self._placements[guild_id] = node.id
+
+        live = {guild_id for node in ranked for guild_id in node.players}
+        for guild_id in self._placements.keys() - live:
+            del self._placements[guild_id]
+
+    async def _restore(self, player: wavelink.Player):
+        """Reapplies the settings a fresh Lavalink player doesn't carry over after a node swap."""
+        logger.info(f"Player for guild {player.guild.id} moved to node <{player.current_node.id}>")
+
+        await player.set_volume(player.volume)
+        if (current_filter := getattr(player, "_filter", None)) is not None:
+            await player.set_filter(current_filter)
+
+    async def _refresh_loop(self):
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.error(f"Lavalink node refresh failed: {e}")
+            await asyncio.sleep(self.interval)
@@ -0,0 +1,26 @@
+import wavelink
+from wavelink import Equalizer, Filter
+
+from notorious_discord_bot.cogs.music.util.track_queue import TrackQueue
+
+
+BASS_PRESETS = {
+    "off": [(0, 0), (1, 0)],
+    "low": [(0, 0.25), (1, 0.15)],
+    "medium": [(0, 0.50), (1, 0.25)],
+    "high": [(0, 0.75), (1, 0.50)],
+    "ultra": [(0, 1), (1, 0.75)],
+    "maximum": [(0, 1), (1, 1.0)],
+    "dummyhard": [(0, 1.0), (1, 1.0), (2, 1.0), (3, 1.0), (4, 1.0)],
+}
+
+
+class MusicPlayer(wavelink.Player):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.queue: TrackQueue = TrackQueue()
+        self.bass = "off"
+
+    async def set_bass(self, level: str, *, seek: bool = True):
+        await self.set_filter(Filter(equalizer=Equalizer(bands=BASS_PRESETS[level])), seek=seek)
+        self.bass = level
@@ -0,0 +1,206 @@
+import asyncio
+import json
+import os
+import sqlite3
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, NamedTuple
+
+import wavelink
+from loguru import logger
+
+from notorious_discord_bot.cogs.music.util.track_info import TrackInfo
+
+
+PLAYER_STATE_INTERVAL = float(os.getenv("PLAYER_STATE_INTERVAL", 5))
+# A snapshot this old is from a bot that was down too long for anyone to still be listening
+PLAYER_STATE_MAX_AGE = float(os.getenv("PLAYER_STATE_MAX_AGE", 30 * 60))
+
+
+def dump_track(track: Any) -> list[Any]:
+    """A track's TrackInfo fields, enough to rebuild it without searching again."""
+    return list(TrackInfo.compact(track))
+
+
+def load_track(entry: list[Any]) -> TrackInfo:
+    return TrackInfo(*entry)
+
+
+def player_position(vc: wavelink.Player) -> int:
+    # wavelink can't extrapolate a position before the first player update from Lavalink
+    return int(vc.position if vc.last_update else vc.last_position)
+
+
+class PlayerSnapshot(NamedTuple):
+    guild_id: int
+    channel_id: int
+    volume: int
+    loop: bool
+    bass: str
+    paused: bool
+    current: TrackInfo | None
+    position: int
+    queue: bytes
+
+    def tracks(self) -> list[TrackInfo]:
+        """Rebuilds the queued tracks, spotify ones stay partial until the prefetcher gets to them."""
+        return [load_track(entry) for entry in json.loads(zlib.decompress(self.queue))]
+
+
+class PlayerStore:
+    """Snapshots players to SQLite so their queues and settings survive a restart.
+
+    Changes only mark a guild dirty. Every `interval` seconds dirty guilds are written in full and
+    the rest only get their position bumped, so a busy queue costs one write per interval. Queues
+    are stored as TrackInfo fields, and encoding and writing them happens on the store's own
+    thread, the event loop only copies the queues.
+    """
+
+    def __init__(self, path: str, *, interval: float = PLAYER_STATE_INTERVAL, max_age: float = PLAYER_STATE_MAX_AGE):
+        self.interval = interval
+        self.max_age = max_age
+
+        self.writes = 0
+        self._players: dict[int, wavelink.Player] = {}
+        self._dirty: set[int] = set()
+        self._task: asyncio.Task | None = None
+
+        # One thread owns the connection, so writes never overlap and run in the order they were made
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="player-store")
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS players (guild_id INTEGER PRIMARY KEY, channel_id INTEGER, volume INTEGER, "
+            "loop INTEGER, bass TEXT, paused INTEGER, current TEXT, position INTEGER, queue BLOB, updated REAL)"
+        )
+        self._db.execute("DELETE FROM players WHERE updated < ?", (time.time() - max_age,))
+        self._db.commit()
+
+    @property
+    def stats(self) -> dict[str, int]:
+        return {"tracked": len(self._players), "dirty": len(self._dirty), "writes": self.writes}
+
+    async def load(self) -> list[PlayerSnapshot]:
+        """Every stored player, most recently active first."""
+        return await asyncio.get_running_loop().run_in_executor(self._executor, self._load)
+
+    def track(self, vc: wavelink.Player):
+        self._players[vc.guild.id] = vc
+        self._dirty.add(vc.guild.id)
+
+        if not self._task or self._task.done():
+            self._task = asyncio.create_task(self._flush_loop())
+
+    def mark(self, guild_id: int):
+        """Notes that a player's queue or settings changed and need writing out."""
+        if guild_id in self._players:
+            self._dirty.add(guild_id)
+
+    def forget(self, guild_id: int):
+        self._players.pop(guild_id, None)
+        self._dirty.discard(guild_id)
+        if self._db:
+            self._executor.submit(self._delete, guild_id)
+
+    def collect(self) -> tuple[list[tuple], list[tuple]]:
+        """Copies out what changed since the last flush, the part of a flush that has to run on the event loop."""
+        now = time.time()
+        snapshots, positions, gone = [], [], []
+
+        for guild_id, vc in self._players.items():
+            if not vc.channel:
+                gone.append(guild_id)
+            elif guild_id in self._dirty:
+                snapshots.append(self._snapshot(vc, now))
+            else:
+                positions.append((player_position(vc), now, guild_id))
+        self._dirty.clear()
+
+        for guild_id in gone:
+            self.forget(guild_id)
+
+        return snapshots, positions
+
+    async def flush(self):
+        snapshots, positions = self.collect()
+        if snapshots or positions:
+            await asyncio.get_running_loop().run_in_executor(self._executor, self._write, snapshots, positions)
+
+    def close(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+        if self._db:
+            try:
+                # The last write runs behind anything already queued on the store's thread
+                self._executor.submit(self._write, *self.collect())
+            except Exception as e:
+                logger.error(f"Couldn't save player state: {e}")
+            self._executor.shutdown(wait=True)
+            self._db.close()
+            self._db = None
+
+    @staticmethod
+    def _snapshot(vc: wavelink.Player, now: float) -> tuple:
+        current = vc.current
+
+        return (
+            vc.guild.id,
+            vc.channel.id,
+            vc.volume,
+            vc.queue.loop,
+            getattr(vc, "bass", "off"),
+            vc.is_paused(),
+            TrackInfo.compact(current) if current else None,
+            player_position(vc) if current else 0,
+            # TrackInfo records are immutable, so the copy can be encoded on another thread
+            list(vc.queue),
+            now,
+        )
+
+    def _load(self) -> list[PlayerSnapshot]:
+        snapshots = []
+        for row in self._db.execute("SELECT * FROM players ORDER BY updated DESC").fetchall():
+            guild_id, channel_id, volume, loop, bass, paused, current, position, queue, _ = row
+            try:
+                current = load_track(json.loads(current)) if current else None
+            except Exception as e:
+                logger.warning(f"Dropping unreadable player state for guild {guild_id}: {e}")
+                self._delete(guild_id)
+                continue
+
+            snapshots.append(PlayerSnapshot(guild_id, channel_id, volume, bool(loop), bass, bool(paused), current, position, queue))
+
+        return snapshots
+
+    def _write(self, snapshots: list[tuple], positions: list[tuple]):
+        rows = []
+        for guild_id, channel_id, volume, loop, bass, paused, current, position, queue, updated in snapshots:
+            rows.append((
+                guild_id, channel_id, volume, loop, bass, paused,
+                json.dumps(current, separators=(",", ":")) if current else None,
+                position,
+                zlib.compress(json.dumps(queue, separators=(",", ":")).encode()),
+                updated,
+            ))
+
+        if rows:
+            self._db.executemany("INSERT OR REPLACE INTO players VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        if positions:
+            self._db.executemany("UPDATE players SET position = ?, updated = ? WHERE guild_id = ?", positions)
+        if rows or positions:
+            self._db.commit()
+            self.writes += 1
+
+    def _delete(self, guild_id: int):
+        self._db.execute("DELETE FROM players WHERE guild_id = ?", (guild_id,))
+        self._db.commit()
+
+    async def _flush_loop(self):
+        while self._players:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Saving player state failed: {e}")
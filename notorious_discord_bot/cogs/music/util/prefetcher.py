@@ -0,0 +1,62 @@
+import asyncio
+import itertools
+from typing import Any, Awaitable, Callable
+
+from loguru import logger
+
+from notorious_discord_bot.cogs.music.util.track_info import TrackInfo
+
+
+def is_partial(track: Any) -> bool:
+    """Whether a queued track still has to be searched for before it can be played."""
+    return isinstance(track, TrackInfo) and track.partial
+
+
+class TrackPrefetcher:
+    """Resolves the partial tracks at the front of a player's queue while the current song plays."""
+
+    def __init__(self, resolver: Callable[[Any], Awaitable[Any]], depth: int = 3, concurrency: int = 2):
+        self.resolver = resolver
+        self.depth = depth
+
+        self._semaphore = asyncio.Semaphore(concurrency)
+        # Keyed by id() of the queued track, the track itself is kept alongside so the id can't be reused
+        self._pending: dict[int, tuple[Any, asyncio.Task]] = {}
+
+    def prefetch(self, queue):
+        """Starts resolving the next few partial tracks in the queue."""
+        upcoming = {id(track): track for track in itertools.islice(queue, self.depth) if is_partial(track)}
+
+        # Anything that dropped out of the window was removed or reordered, no point finishing it
+        for key in self._pending.keys() - upcoming.keys():
+            self._pending.pop(key)[1].cancel()
+
+        for key, track in upcoming.items():
+            if key not in self._pending:
+                self._pending[key] = (track, asyncio.create_task(self._fetch(track)))
+
+    async def resolve(self, track: Any) -> Any:
+        """Returns a playable version of a queued track, waiting on a prefetch or searching inline on a miss."""
+        if not is_partial(track):
+            return track.track()
+
+        _, task = self._pending.pop(id(track), (None, None))
+        if task is not None and not task.cancelled():
+            if (result := await task) is not None:
+                return result
+
+        return await self.resolver(track)
+
+    def cancel(self):
+        for _, task in self._pending.values():
+            task.cancel()
+        self._pending.clear()
+
+    async def _fetch(self, track: Any) -> Any | None:
+        async with self._semaphore:
+            try:
+                return await self.resolver(track)
+            except Exception as e:
+                # The track gets searched for again inline once it reaches the front of the queue
+                logger.warning(f"Prefetch of {track.title} failed: {e}")
+                return None
@@ -0,0 +1,22 @@
+import re
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+
+# Query parameters that only track where a link was shared from and never change what it resolves to
+TRACKING_PARAMS = {"si", "feature", "pp", "app", "context", "nd"}
+
+
+def normalize(query: str) -> str:
+    """Turns a query or URL into the key it is cached under."""
+    query = query.strip()
+
+    if not re.match(r"https?://", query, re.I):
+        return " ".join(query.casefold().split())
+
+    url = urlsplit(query)
+    params = [
+        (k, v) for k, v in parse_qsl(url.query)
+        if k not in TRACKING_PARAMS and not k.startswith("utm_")
+    ]
+    host = url.netloc.lower().removeprefix("www.")
+    return urlunsplit(("https", host, url.path.rstrip("/"), urlencode(params), ""))
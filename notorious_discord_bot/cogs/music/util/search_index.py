@@ -0,0 +1,109 @@
+import re
+from bisect import bisect_left, insort
+from collections import Counter, OrderedDict
+from typing import Any, NamedTuple
+
+
+WORD = re.compile(r"\w+")
+
+
+def words(text: str) -> list[str]:
+    return WORD.findall(text.casefold())
+
+
+class IndexedTrack(NamedTuple):
+    title: str
+    author: str
+    uri: str
+
+
+class SearchIndex:
+    """Prefix index over the titles and authors of tracks the bot has already seen, for /play autocomplete.
+
+    Words live in one sorted array of (word, uri) pairs, so every word starting with a prefix is a
+    single run found by bisection. Tracks are dropped least recently seen first past `max_tracks`.
+    """
+
+    def __init__(self, max_tracks: int = 5000, max_guild_plays: int = 500):
+        self.max_tracks = max_tracks
+        self.max_guild_plays = max_guild_plays
+
+        self._tracks: OrderedDict[str, IndexedTrack] = OrderedDict()
+        self._words: list[tuple[str, str]] = []
+        self._plays: dict[int, Counter] = {}
+        self._total_plays: Counter = Counter()
+
+    def __len__(self):
+        return len(self._tracks)
+
+    @property
+    def stats(self) -> dict[str, int]:
+        return {"tracks": len(self._tracks), "words": len(self._words), "guilds": len(self._plays)}
+
+    def add(self, track: Any):
+        uri, title = getattr(track, "uri", None), getattr(track, "title", None)
+        if not uri or not title:
+            return
+
+        if uri in self._tracks:
+            self._tracks.move_to_end(uri)
+            return
+
+        # Spotify tracks list their artists instead of an author
+        author = getattr(track, "author", None) or ", ".join(getattr(track, "artists", ()))
+        entry = self._tracks[uri] = IndexedTrack(title, author, uri)
+        for word in set(words(f"{entry.title} {entry.author}")):
+            insort(self._words, (word, uri))
+
+        while len(self._tracks) > self.max_tracks:
+            self._drop(next(iter(self._tracks)))
+
+    def played(self, guild_id: int, track: Any):
+        self.add(track)
+        if (uri := getattr(track, "uri", None)) not in self._tracks:
+            return
+
+        plays = self._plays.setdefault(guild_id, Counter())
+        plays[uri] += 1
+        self._total_plays[uri] += 1
+
+        if len(plays) > self.max_guild_plays:
+            self._plays[guild_id] = Counter(dict(plays.most_common(self.max_guild_plays // 2)))
+
+    def search(self, guild_id: int, text: str, limit: int = 25) -> list[IndexedTrack]:
+        """Tracks with a word starting with each typed word, the ones this guild plays most first."""
+        plays = self._plays.get(guild_id) or Counter()
+        typed = set(words(text))
+
+        if not typed:
+            return [self._tracks[uri] for uri, _ in plays.most_common(limit) if uri in self._tracks]
+
+        matches = None
+        # The longest word has the fewest matches, so start with it to keep the intersections small
+        for word in sorted(typed, key=len, reverse=True):
+            found = self._prefixed(word)
+            matches = found if matches is None else matches & found
+            if not matches:
+                return []
+
+        ranked = sorted(matches, key=lambda uri: (plays[uri], self._total_plays[uri]), reverse=True)
+        return [self._tracks[uri] for uri in ranked[:limit]]
+
+    def _prefixed(self, prefix: str) -> set[str]:
+        found = set()
+        for i in range(bisect_left(self._words, (prefix,)), len(self._words)):
+            word, uri = self._words[i]
+            if not word.startswith(prefix):
+                break
+            found.add(uri)
+
+        return found
+
+    def _drop(self, uri: str):
+        entry = self._tracks.pop(uri)
+        self._total_plays.pop(uri, None)
+
+        for word in set(words(f"{entry.title} {entry.author}")):
+            i = bisect_left(self._words, (word, uri))
+            if i < len(self._words) and self._words[i] == (word, uri):
+                del self._words[i]
@@ -0,0 +1,47 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Hashable
+
+
+class SingleFlight:
+    """Coalesces concurrent calls with the same key into one, every caller gets its result or its exception.
+
+    The shared call runs as its own task, so a caller giving up doesn't cancel it for the others.
+    """
+
+    def __init__(self, timeout: float | None = None):
+        self.timeout = timeout
+
+        self.calls = 0
+        self.shared = 0
+        self._flights: dict[Hashable, asyncio.Task] = {}
+
+    def __len__(self):
+        return len(self._flights)
+
+    @property
+    def stats(self) -> dict[str, int]:
+        return {"in_flight": len(self._flights), "calls": self.calls, "shared": self.shared}
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[Any]], *, timeout: float | None = None) -> Any:
+        if (flight := self._flights.get(key)) is None:
+            flight = asyncio.create_task(self._run(func, timeout or self.timeout))
+            flight.add_done_callback(lambda task: self._land(key, task))
+            self._flights[key] = flight
+            self.calls += 1
+        else:
+            self.shared += 1
+
+        return await asyncio.shield(flight)
+
+    async def _run(self, func: Callable[[], Awaitable[Any]], timeout: float | None) -> Any:
+        if timeout is None:
+            return await func()
+        return await asyncio.wait_for(func(), timeout)
+
+    def _land(self, key: Hashable, task: asyncio.Task):
+        if self._flights.get(key) is task:
+            del self._flights[key]
+
+        # Every caller may have given up already, don't let the exception be reported as unretrieved
+        if not task.cancelled():
+            task.exception()
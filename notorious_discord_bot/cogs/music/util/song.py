@@ -1,29 +1,72 @@
+import asyncio
+
 import discord
+from discord.ext import commands
 
+from notorious_discord_bot.cogs.music.util.embed_cache import EmbedCache
+from notorious_discord_bot.cogs.music.util.track_info import TrackInfo
 from notorious_discord_bot.cogs.music.util.ytdl_source import YTDLSource
 
+embed_cache = EmbedCache()
+
 class Song:
-    __slots__ = ("source", "requester")
+    __slots__ = ("info", "requester", "channel", "source", "_opening")
+
+    def __init__(self, info: TrackInfo, ctx: commands.Context):
+        self.info = info
+        self.requester = ctx.author
+        self.channel = ctx.channel
+        # Only opened once the song is next up, see open()
+        self.source: YTDLSource | None = None
+        self._opening: asyncio.Task | None = None
+
+    def __str__(self):
+        return str(self.info)
+
+    async def open(self, volume: float) -> YTDLSource:
+        """Starts the song's FFmpeg process, however many times this gets called while it's starting."""
+        if self._opening is None:
+            self._opening = asyncio.create_task(self._open(volume))
+
+        return await self._opening
 
-    def __init__(self, source: YTDLSource):
-        self.source = source
-        self.requester = source.requester
+    async def _open(self, volume: float) -> YTDLSource:
+        # Songs can wait in the queue for longer than their stream URL lasts
+        self.info = await YTDLSource.refresh(self.info)
+        self.source = YTDLSource.open(self.info, volume=volume)
+        return self.source
+
+    def cleanup(self):
+        """Stops the song's FFmpeg process, or its start, it's opened afresh if it still gets played."""
+        if self._opening and not self._opening.done():
+            self._opening.cancel()
+        elif self.source:
+            self.source.cleanup()
+
+        self._opening = None
+        self.source = None
 
     def create_embed(self):
+        embed = embed_cache.get(self.info.uri, self.render_embed)
+        embed.insert_field_at(1, name="Requested by", value=self.requester.mention)
+
+        return embed
+
+    def render_embed(self):
+        """Builds the parts of the embed shared by every request of this song."""
         embed = (
             discord.Embed(
                 title="Now playing",
-                description="```css\n{0.source.title}\n```".format(self),
+                description="```css\n{0.info.title}\n```".format(self),
                 color=discord.Color.blurple(),
             )
-            .add_field(name="Duration", value=self.source.duration)
-            .add_field(name="Requested by", value=self.requester.mention)
+            .add_field(name="Duration", value=YTDLSource.parse_duration(self.info.duration // 1000) or "Live")
             .add_field(
                 name="Uploader",
-                value="[{0.source.uploader}]({0.source.uploader_url})".format(self),
+                value="[{0.info.author}]({0.info.author_url})".format(self),
             )
-            .add_field(name="URL", value="[Click]({0.source.url})".format(self))
-            .set_thumbnail(url=self.source.thumbnail)
+            .add_field(name="URL", value="[Click]({0.info.uri})".format(self))
+            .set_thumbnail(url=self.info.thumbnail)
         )
 
         return embed
@@ -1,13 +1,15 @@
 import asyncio
-import itertools
 import random
 
+from notorious_discord_bot.cogs.music.util.indexed_list import IndexedList
+
+
 class SongQueue(asyncio.Queue):
+    def _init(self, maxsize):
+        self._queue = IndexedList(key=lambda song: song.info.uri)
+
     def __getitem__(self, item):
-        if isinstance(item, slice):
-            return list(itertools.islice(self._queue, item.start, item.stop, item.step))
-        else:
-            return self._queue[item]
+        return self._queue[item]
 
     def __iter__(self):
         return self._queue.__iter__()
@@ -16,10 +18,28 @@ class SongQueue(asyncio.Queue):
         return self.qsize()
 
     def clear(self):
+        # Only the next song can have an FFmpeg process started already, cleanup() stops it
+        for song in self._queue:
+            song.cleanup()
         self._queue.clear()
 
     def shuffle(self):
         random.shuffle(self._queue)
 
     def remove(self, index: int):
-        del self._queue[index]
+        self._queue.pop_at(index).cleanup()
+
+    def move(self, source: int, destination: int):
+        self._queue.move(source, destination)
+
+    def dedup(self) -> int:
+        songs = list(self._queue)
+        removed = self._queue.dedup()
+
+        if removed:
+            kept = set(map(id, self._queue))
+            for song in songs:
+                if id(song) not in kept:
+                    song.cleanup()
+
+        return removed
@@ -0,0 +1,160 @@
+import json
+import sqlite3
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+
+import wavelink
+from loguru import logger
+from wavelink.ext import spotify
+
+
+def encode(value: Any) -> Any:
+    """A resolved result as the plain Lavalink and Spotify JSON it was built from."""
+    if isinstance(value, list):
+        return {"list": [encode(item) for item in value]}
+    if isinstance(value, wavelink.YouTubePlaylist):
+        return {"playlist": {"name": value.name, "selectedTrack": value.selected_track}, "tracks": [track.data for track in value.tracks]}
+    if isinstance(value, spotify.SpotifyTrack):
+        return {"spotify": value.raw}
+    if isinstance(value, wavelink.Playable):
+        return {"cls": type(value).__name__, "data": {"encoded": value.encoded, "info": value.data["info"]}}
+
+    raise TypeError(f"Can't persist {type(value).__name__}")
+
+
+def decode(entry: dict[str, Any]) -> Any:
+    if "list" in entry:
+        return [decode(item) for item in entry["list"]]
+    if "playlist" in entry:
+        return wavelink.YouTubePlaylist({"playlistInfo": entry["playlist"], "tracks": entry["tracks"]})
+    if "spotify" in entry:
+        return spotify.SpotifyTrack(entry["spotify"])
+
+    # Only track classes can be named here, never anything else in wavelink
+    cls = getattr(wavelink, entry["cls"], None)
+    if not (isinstance(cls, type) and issubclass(cls, wavelink.Playable)):
+        cls = wavelink.GenericTrack
+    return cls(entry["data"])
+
+
+class TrackCache:
+    """LRU cache of resolved tracks with a TTL, optionally persisted to SQLite.
+
+    Entries are persisted as the JSON payloads their tracks were built from. Lookups read the
+    database directly, every write goes through a single thread of its own so no commit runs on
+    the event loop.
+    """
+
+    def __init__(self, max_size: int = 2048, ttl: float = 6 * 60 * 60, path: str | None = None):
+        self.max_size = max_size
+        self.ttl = ttl
+
+        self._entries: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+        self._db = None
+        self._writer = None
+        self._executor = None
+        if path:
+            self._writer = sqlite3.connect(path, check_same_thread=False)
+            # WAL lets lookups read on the event loop while the writer thread commits
+            self._writer.execute("PRAGMA journal_mode=WAL")
+            self._writer.execute(
+                "CREATE TABLE IF NOT EXISTS tracks (key TEXT PRIMARY KEY, value TEXT, expires REAL, used REAL)"
+            )
+            self._writer.execute("DELETE FROM tracks WHERE expires < ?", (time.time(),))
+            self._writer.commit()
+            self._db = sqlite3.connect(path)
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="track-cache")
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def stats(self) -> dict[str, int]:
+        return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+    def get(self, key: str) -> Any | None:
+        now = time.time()
+
+        entry = self._entries.get(key)
+        if entry is None and self._db:
+            entry = self._load(key)
+            if entry is not None:
+                self._store(key, entry)
+
+        if entry is None or entry[0] < now:
+            if entry is not None:
+                self._entries.pop(key, None)
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, key: str, value: Any):
+        entry = (time.time() + self.ttl, value)
+        self._store(key, entry)
+
+        if self._db:
+            self._executor.submit(self._write, key, value, entry[0])
+
+    def close(self):
+        if self._db:
+            self._executor.shutdown(wait=True)
+            self._writer.close()
+            self._db.close()
+            self._db = None
+
+    def _store(self, key: str, entry: tuple[float, Any]):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def _load(self, key: str) -> tuple[float, Any] | None:
+        row = self._db.execute("SELECT value, expires FROM tracks WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+
+        value, expires = row
+        if expires < time.time():
+            self._executor.submit(self._execute, "DELETE FROM tracks WHERE key = ?", (key,))
+            return None
+
+        try:
+            value = decode(json.loads(value))
+        except Exception as e:
+            logger.warning(f"Dropping unreadable cache entry for {key}: {e}")
+            self._executor.submit(self._execute, "DELETE FROM tracks WHERE key = ?", (key,))
+            return None
+
+        self._executor.submit(self._execute, "UPDATE tracks SET used = ? WHERE key = ?", (time.time(), key))
+        return expires, value
+
+    def _write(self, key: str, value: Any, expires: float):
+        # Encoded on the writer thread too, resolved tracks are never changed once they're cached
+        try:
+            payload = json.dumps(encode(value), separators=(",", ":"))
+        except (TypeError, ValueError) as e:
+            logger.warning(f"Not persisting cache entry for {key}: {e}")
+            return
+
+        self._writer.execute(
+            "INSERT OR REPLACE INTO tracks (key, value, expires, used) VALUES (?, ?, ?, ?)",
+            (key, payload, expires, time.time()),
+        )
+        self._writer.execute(
+            "DELETE FROM tracks WHERE key IN (SELECT key FROM tracks ORDER BY used DESC LIMIT -1 OFFSET ?)",
+            (self.max_size,),
+        )
+        self._writer.commit()
+
+    def _execute(self, sql: str, params: tuple):
+        self._writer.execute(sql, params)
+        self._writer.commit()
@@ -0,0 +1,129 @@
+import sys
+from typing import Any, NamedTuple
+from urllib.parse import parse_qs, urlsplit
+
+import wavelink
+from wavelink.ext import spotify
+
+
+def stream_expiry(info: dict[str, Any]) -> float | None:
+    """When the info's stream URL stops working, for hosts that say so in the URL."""
+    expire = parse_qs(urlsplit(info.get("url") or "").query).get("expire")
+    try:
+        return float(expire[0]) if expire else None
+    except ValueError:
+        return None
+
+
+def intern(value: str | None) -> str:
+    return sys.intern(value) if value else ""
+
+
+class TrackInfo(NamedTuple):
+    """Everything a queued track needs to be listed, shown and played, shared by both music cogs.
+
+    Queues hold these instead of youtube_dl info dicts or Lavalink and Spotify payloads. Tuples carry
+    no __dict__ and can't be changed, and the strings that repeat across a queue are interned.
+    """
+
+    # The wavelink track class, or youtube_dl's extractor key
+    kind: str
+    id: str
+    title: str
+    author: str
+    uri: str
+    # Milliseconds, 0 for streams
+    duration: int
+    is_stream: bool = False
+    thumbnail: str | None = None
+    author_url: str | None = None
+    # Lavalink's encoded track, or the stream URL youtube_dl found
+    source: str | None = None
+    expires: float | None = None
+    isrc: str | None = None
+    # The audio codec youtube_dl picked, Opus streams can be sent on without re-encoding
+    codec: str | None = None
+
+    def __str__(self):
+        return f"**{self.title}** by **{self.author}**"
+
+    @property
+    def partial(self) -> bool:
+        """Whether the track still has to be searched for before Lavalink can play it."""
+        return self.kind == "SpotifyTrack"
+
+    @classmethod
+    def compact(cls, track: Any) -> "TrackInfo":
+        return track if isinstance(track, cls) else cls.from_track(track)
+
+    @classmethod
+    def from_track(cls, track: wavelink.Playable | spotify.SpotifyTrack) -> "TrackInfo":
+        if isinstance(track, spotify.SpotifyTrack):
+            return cls(
+                "SpotifyTrack",
+                track.id,
+                intern(track.title),
+                intern(", ".join(track.artists)),
+                track.uri,
+                track.length,
+                thumbnail=track.images[0] if track.images else None,
+                isrc=track.isrc,
+            )
+
+        return cls(
+            intern(type(track).__name__),
+            track.identifier or "",
+            intern(track.title),
+            intern(track.author),
+            track.uri or "",
+            track.length,
+            is_stream=track.is_stream,
+            source=track.encoded,
+        )
+
+    @classmethod
+    def from_info(cls, info: dict[str, Any]) -> "TrackInfo":
+        """Keeps what the legacy player reads out of a processed youtube_dl info dict."""
+        return cls(
+            intern(info.get("extractor_key")),
+            info.get("id") or "",
+            intern(info.get("title")),
+            intern(info.get("uploader")),
+            info.get("webpage_url") or "",
+            int(info.get("duration") or 0) * 1000,
+            is_stream=bool(info.get("is_live")),
+            thumbnail=info.get("thumbnail"),
+            author_url=info.get("uploader_url"),
+            source=info.get("url"),
+            expires=stream_expiry(info),
+            codec=intern(info.get("acodec")) or None,
+        )
+
+    def track(self) -> wavelink.Playable | spotify.SpotifyTrack:
+        """Rebuilds the wavelink track this was made from, Spotify ones come back partial."""
+        if self.partial:
+            return spotify.SpotifyTrack({
+                "album": {"name": "", "images": [{"url": self.thumbnail}] if self.thumbnail else []},
+                "artists": [{"name": artist} for artist in self.author.split(", ")],
+                "name": self.title,
+                "uri": self.uri,
+                "id": self.id,
+                "duration_ms": self.duration,
+                "external_ids": {"isrc": self.isrc} if self.isrc else {},
+            })
+
+        cls = getattr(wavelink, self.kind, wavelink.GenericTrack)
+        return cls({
+            "encoded": self.source,
+            "info": {
+                "identifier": self.id,
+                "isSeekable": not self.is_stream,
+                "author": self.author,
+                "length": self.duration,
+                "isStream": self.is_stream,
+                "position": 0,
+                "title": self.title,
+                "uri": self.uri or None,
+                "sourceName": "youtube" if self.kind.startswith("YouTube") else None,
+            },
+        })
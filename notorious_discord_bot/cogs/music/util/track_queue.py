@@ -0,0 +1,56 @@
+from typing import Any, Hashable
+
+import wavelink
+
+from notorious_discord_bot.cogs.music.util.indexed_list import IndexedList
+from notorious_discord_bot.cogs.music.util.track_info import TrackInfo
+
+
+def track_key(track: Any) -> Hashable:
+    """What counts as the same track when deduplicating a queue."""
+    return getattr(track, "identifier", None) or getattr(track, "id", None) or id(track)
+
+
+def check_track(item: Any) -> Any:
+    """wavelink's check that only tracks get queued, letting TrackInfo records through as well."""
+    return item if isinstance(item, TrackInfo) else wavelink.BaseQueue._check_playable(item)
+
+
+class TrackHistory(wavelink.BaseQueue):
+    _check_playable = staticmethod(check_track)
+
+
+class TrackQueue(wavelink.Queue):
+    """wavelink's Queue backed by an IndexedList, so big queues can be paged and edited cheaply.
+
+    Tracks are stored as TrackInfo records, the prefetcher turns them back into wavelink tracks to play.
+    """
+
+    _check_playable = staticmethod(check_track)
+
+    def __init__(self):
+        super().__init__()
+        self._queue = IndexedList(key=track_key)
+        self.history = TrackHistory()
+
+    # put_wait skips wavelink's type check, so it's repeated here before compacting
+    def _put(self, item: Any):
+        super()._put(TrackInfo.compact(self._check_playable(item)))
+
+    def _insert(self, index: int, item: Any):
+        super()._insert(index, TrackInfo.compact(self._check_playable(item)))
+
+    def __getitem__(self, index: int | slice):
+        return self._queue[index]
+
+    def page(self, start: int, stop: int) -> list:
+        return self._queue.page(start, stop)
+
+    def remove_at(self, index: int):
+        return self._queue.pop_at(index)
+
+    def move(self, source: int, destination: int):
+        self._queue.move(source, destination)
+
+    def dedup(self) -> int:
+        return self._queue.dedup()
@@ -0,0 +1,69 @@
+import re
+from typing import Callable, Literal, NamedTuple
+from urllib.parse import parse_qsl
+
+from notorious_discord_bot.cogs.music.util.query_key import normalize
+
+
+# Auto-generated mixes are different for everyone, a link to one means the video it was opened from
+MIX_PREFIX = "RD"
+
+VIDEO_ID = re.compile(r"[\w-]{11}")
+YOUTUBE_HOST = r"https?://(?:www\.|m\.|music\.)?youtube\.com"
+
+
+class Route(NamedTuple):
+    """How to resolve a /play query: `id` is canonical, so it doubles as the cache key, and `url` is what gets loaded."""
+    kind: Literal["track", "playlist", "spotify", "spotify_playlist", "search"]
+    id: str
+    url: str
+
+
+def _youtube(video_id: str | None, list_id: str | None) -> Route | None:
+    if video_id and not VIDEO_ID.fullmatch(video_id):
+        video_id = None
+
+    if list_id and not (video_id and list_id.startswith(MIX_PREFIX)):
+        return Route("playlist", list_id, f"https://www.youtube.com/playlist?list={list_id}")
+    if video_id:
+        return Route("track", video_id, f"https://www.youtube.com/watch?v={video_id}")
+    return None
+
+
+def _youtube_query(match: re.Match) -> Route | None:
+    params = dict(parse_qsl(match["params"] or ""))
+    return _youtube(params.get("v"), params.get("list"))
+
+
+def _youtube_path(match: re.Match) -> Route | None:
+    params = dict(parse_qsl(match["params"] or ""))
+    return _youtube(match["video"], params.get("list"))
+
+
+def _spotify(match: re.Match) -> Route:
+    kind, spotify_id = match["type"].lower(), match["id"]
+    # Albums and playlists are many tracks, they get loaded in like a YouTube playlist
+    route_kind = "spotify" if kind == "track" else "spotify_playlist"
+    return Route(route_kind, f"{kind}/{spotify_id}", f"https://open.spotify.com/{kind}/{spotify_id}")
+
+
+ROUTES: list[tuple[re.Pattern, Callable[[re.Match], Route | None]]] = [
+    (re.compile(rf"{YOUTUBE_HOST}/(?:watch|playlist)\?(?P<params>[^#\s]*)", re.I), _youtube_query),
+    (re.compile(rf"{YOUTUBE_HOST}/(?:shorts|live|embed)/(?P<video>[\w-]+)(?:\?(?P<params>[^#\s]*))?", re.I), _youtube_path),
+    (re.compile(r"https?://youtu\.be/(?P<video>[\w-]+)(?:\?(?P<params>[^#\s]*))?", re.I), _youtube_path),
+    (re.compile(r"https?://open\.spotify\.com/(?:intl-[\w-]+/)?(?P<type>track|album|playlist)/(?P<id>[a-zA-Z0-9]+)", re.I), _spotify),
+    (re.compile(r"spotify:(?P<type>track|album|playlist):(?P<id>[a-zA-Z0-9]+)", re.I), _spotify),
+]
+
+
+def route(query: str) -> Route:
+    """Matches a query against the routing table, anything that isn't a link we know is a search."""
+    query = query.strip()
+
+    # Schemes are case-insensitive, like the patterns
+    if query.lower().startswith(("http", "spotify:")):
+        for pattern, build in ROUTES:
+            if (match := pattern.match(query)) and (result := build(match)):
+                return result
+
+    return Route("search", normalize(query), query)
@@ -1,11 +1,16 @@
-from async_timeout import timeout
 from discord.ext import commands
 import asyncio
+import os
 
-from wavelink import Queue
-
+from notorious_discord_bot.cogs.music.util.audio_filter import AudioFilter
+from notorious_discord_bot.cogs.music.util.idle_reaper import PlayerUsage
+from notorious_discord_bot.cogs.music.util.song import Song
 from notorious_discord_bot.cogs.music.util.song_queue import SongQueue
-from notorious_discord_bot.cogs.music.util.ytdl_source import VoiceError
+from notorious_discord_bot.cogs.music.util.ytdl_source import VoiceError, YTDLError, YTDLSource
+
+
+# How many 20ms frames of the next song to read ahead while the current one plays, 0 turns it off
+LEGACY_PRELOAD_FRAMES = int(os.getenv("LEGACY_PRELOAD_FRAMES", 50))
 
 
 class VoiceState:
@@ -16,16 +21,19 @@ class VoiceState:
         self.current = None
         self.voice = None
         self.next = asyncio.Event()
-        self.songs = Queue()
+        self.songs = SongQueue()
 
         self._loop = False
         self._volume = 0.5
+        # Applied to whatever is playing, so changes are heard straight away
+        self.audio_filter = AudioFilter()
+        # A fresh source for the current song, ready to go when it's looping
+        self._repeat: YTDLSource | None = None
+        # The queued song preload() opened, closed again if it stops being next
+        self._preloaded: Song | None = None
 
         self.audio_player = bot.loop.create_task(self.audio_player_task())
 
-    def __del__(self):
-        self.audio_player.cancel()
-
     @property
     def loop(self):
         return self._loop
@@ -34,6 +42,11 @@ class VoiceState:
     def loop(self, value: bool):
         self._loop = value
 
+        if not value and self._repeat:
+            self._repeat.cleanup()
+            self._repeat = None
+        self.preload()
+
     @property
     def volume(self):
         return self._volume
@@ -46,25 +59,39 @@ class VoiceState:
     def is_playing(self):
         return self.voice and self.current
 
+    def usage(self) -> PlayerUsage:
+        if not self.voice:
+            return PlayerUsage(False, 0, len(self.songs))
+
+        listeners = sum(1 for member in self.voice.channel.members if not member.bot)
+        return PlayerUsage(self.voice.is_playing() or self.voice.is_paused(), listeners, len(self.songs))
+
     async def audio_player_task(self):
         while True:
             self.next.clear()
 
-            if not self.loop:
-                # Try to get the next song within 3 minutes.
-                # If no song will be added to the queue in time,
-                # the player will disconnect due to performance
-                # reasons.
+            if not self.loop or not self.current:
+                # The cog's idle reaper disconnects the player if nothing gets queued for too long
+                self.current = await self.songs.get()
+                if self.current is self._preloaded:
+                    self._preloaded = None
                 try:
-                    async with timeout(180):  # 3 minutes
-                        self.current = await self.songs.get()
-                except asyncio.TimeoutError:
-                    self.bot.loop.create_task(self.stop())
-                    return
+                    # Queued songs are only metadata, FFmpeg starts here unless preload() got to it first
+                    await self.current.open(self._volume)
+                except YTDLError as e:
+                    await self.current.channel.send(f"Couldn't play {self.current}: {e}")
+                    self.current = None
+                    continue
+            else:
+                # The last source ran to its end, so the song has to be played from a new one
+                self.current.source = self._repeat or self.current.source.restart()
+                self._repeat = None
 
             self.current.source.volume = self._volume
+            self.current.source.audio_filter = self.audio_filter
             self.voice.play(self.current.source, after=self.play_next_song)
-            await self.current.source.channel.send(embed=self.current.create_embed())
+            self.preload()
+            await self.current.channel.send(embed=self.current.create_embed())
 
             await self.next.wait()
 
@@ -74,12 +101,64 @@ class VoiceState:
 
         self.next.set()
 
+    def preload(self):
+        """Starts opening and buffering whatever plays after the current song, so the handoff has no gap."""
+        if not self.current or LEGACY_PRELOAD_FRAMES <= 0:
+            return
+
+        upcoming = self.songs[0] if not self.loop and len(self.songs) else None
+        if self._preloaded is not upcoming:
+            # Shuffled, moved or removed from the front of the queue, its process and frames go until it's next again
+            if self._preloaded:
+                self._preloaded.cleanup()
+            self._preloaded = upcoming
+            if upcoming:
+                self.bot.loop.create_task(self._preload_song(upcoming))
+
+        if self.loop:
+            if not self._repeat:
+                self._repeat = self.current.source.restart()
+            self._buffer(self._repeat)
+
+    async def _preload_song(self, song: Song):
+        try:
+            source = await song.open(self._volume)
+        except (YTDLError, asyncio.CancelledError):
+            # Reported by the audio player once the song comes up, or it stopped being next
+            return
+
+        if song is self._preloaded:
+            self._buffer(source)
+
+    def _buffer(self, source: YTDLSource):
+        # Set before preloading so a filtered song doesn't preload Opus frames it can't use
+        source.audio_filter = self.audio_filter
+        self.bot.loop.run_in_executor(None, source.preload, LEGACY_PRELOAD_FRAMES)
+
+    def set_bass(self, gain: float):
+        self.audio_filter.set_bass(gain)
+        self._apply_filter()
+
+    def set_band(self, frequency: int, gain: float):
+        self.audio_filter.set_band(frequency, gain)
+        self._apply_filter()
+
+    def _apply_filter(self):
+        # Reassigning lets a source in Opus passthrough switch over to PCM for the filter
+        if self.current:
+            self.current.source.audio_filter = self.audio_filter
+
     def skip(self):
         if self.is_playing:
             self.voice.stop()
 
     async def stop(self):
+        self.audio_player.cancel()
         self.songs.clear()
+        self._preloaded = None
+        if self._repeat:
+            self._repeat.cleanup()
+            self._repeat = None
 
         if self.voice:
             await self.voice.disconnect()
@@ -0,0 +1,168 @@
+import asyncio
+import itertools
+import multiprocessing
+import os
+import statistics
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from loguru import logger
+
+
+YTDL_WORKERS = int(os.getenv("YTDL_WORKERS", min(os.cpu_count() or 1, 4)))
+YTDL_MAX_PENDING = int(os.getenv("YTDL_MAX_PENDING", 32))
+YTDL_TIMEOUT = float(os.getenv("YTDL_TIMEOUT", 30))
+
+
+class ExtractionError(Exception):
+    pass
+
+
+# Bulky parts of a processed info dict that nothing reads, dropped before it is sent back
+UNUSED_INFO_KEYS = ("formats", "thumbnails", "subtitles", "automatic_captions", "requested_formats")
+
+
+# Each worker process builds its own YoutubeDL once, in _init_worker
+_ytdl = None
+
+
+def _init_worker(options: dict):
+    global _ytdl
+    import youtube_dl
+
+    # Suppress noise about console usage from errors
+    youtube_dl.utils.bug_reports_message = lambda: ''
+    _ytdl = youtube_dl.YoutubeDL(options)
+
+
+def _extract(search: str, process: bool) -> dict | None:
+    try:
+        data = _ytdl.extract_info(search, download=False, process=process)
+    except Exception as e:
+        # youtube_dl errors carry tracebacks around, which can't be sent back to the main process
+        raise ExtractionError(str(e)) from None
+
+    if data and "entries" in data and not isinstance(data["entries"], list):
+        # Unprocessed results hold a lazy generator of entries, only the first real one is ever used
+        data["entries"] = list(itertools.islice(filter(None, data["entries"]), 1))
+
+    for info in [data, *(data or {}).get("entries", ())]:
+        if info:
+            for key in UNUSED_INFO_KEYS:
+                info.pop(key, None)
+
+    return data
+
+
+class ExtractionPool:
+    """Runs youtube_dl extraction in worker processes so it can't stall the event loop.
+
+    At most `workers` extractions run at once and up to `max_pending` more may wait for a
+    worker, anything beyond that is turned away straight away instead of queueing forever.
+    """
+
+    def __init__(self, options: dict, *, workers: int = YTDL_WORKERS, max_pending: int = YTDL_MAX_PENDING, timeout: float = YTDL_TIMEOUT):
+        self.options = options
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+
+        self._executor: ProcessPoolExecutor | None = None
+        self._slots = asyncio.Semaphore(workers)
+
+        self.pending = 0
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.timeouts = 0
+        self.rejected = 0
+        self._latencies: deque[float] = deque(maxlen=512)
+
+    @property
+    def stats(self) -> dict[str, float]:
+        latencies = sorted(self._latencies)
+        return {
+            "pending": self.pending,
+            "running": self.running,
+            "completed": self.completed,
+            "failed": self.failed,
+            "timeouts": self.timeouts,
+            "rejected": self.rejected,
+            "latency_p50": statistics.median(latencies) if latencies else 0.0,
+            "latency_p95": latencies[int(len(latencies) * 0.95)] if latencies else 0.0,
+        }
+
+    async def extract(self, search: str, *, process: bool = True, timeout: float | None = None) -> dict | None:
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise ExtractionError("Too many songs are being looked up right now, try again in a moment")
+
+        timeout = timeout or self.timeout
+        start = time.perf_counter()
+        # Decremented however the wait ends, a caller cancelled while queued mustn't hold a pending place
+        self.pending += 1
+        try:
+            # The timeout covers waiting for a worker too, not only the extraction itself
+            await asyncio.wait_for(self._slots.acquire(), timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise ExtractionError(f"Timed out looking up `{search}`") from None
+        finally:
+            self.pending -= 1
+
+        self.running += 1
+        return await self._run(search, process, start, max(timeout - (time.perf_counter() - start), 0.0))
+
+    def shutdown(self):
+        if self._executor:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def _run(self, search: str, process: bool, start: float, timeout: float) -> dict | None:
+        loop = asyncio.get_running_loop()
+        future = None
+
+        try:
+            future = self._get_executor().submit(_extract, search, process)
+            # The worker keeps its slot until the call really ends, even once the caller has given up on it
+            future.add_done_callback(lambda _: loop.is_closed() or loop.call_soon_threadsafe(self._finished, start))
+            result = await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise ExtractionError(f"Timed out looking up `{search}`") from None
+        except ExtractionError:
+            self.failed += 1
+            raise
+        except BrokenProcessPool:
+            logger.error("youtube_dl worker pool broke, starting a new one")
+            self.failed += 1
+            self._executor = None
+            raise ExtractionError(f"Couldn't look up `{search}`, please try again") from None
+        finally:
+            if future is None:
+                self._finished(start)
+            else:
+                # Only drops the call if no worker has picked it up yet
+                future.cancel()
+
+        self.completed += 1
+        return result
+
+    def _finished(self, start: float):
+        self.running -= 1
+        self._slots.release()
+        self._latencies.append(time.perf_counter() - start)
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if not self._executor:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                # Forking a process that's running an event loop and voice threads isn't safe
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(self.options,),
+            )
+
+        return self._executor
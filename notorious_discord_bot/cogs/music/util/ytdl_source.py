@@ -1,13 +1,37 @@
-import asyncio
-import functools
+import audioop
+import os
+import shlex
+import threading
+import time
+from collections import deque
 
-from discord.ext import commands
 import discord
-import youtube_dl
 
+from notorious_discord_bot.cogs.music.util.audio_cache import AUDIO_CACHE_MAX_DURATION, audio_cache
+from notorious_discord_bot.cogs.music.util.audio_filter import AudioFilter
+from notorious_discord_bot.cogs.music.util.info_cache import EXPIRY_MARGIN, InfoCache
+from notorious_discord_bot.cogs.music.util.metrics import metrics
+from notorious_discord_bot.cogs.music.util.single_flight import SingleFlight
+from notorious_discord_bot.cogs.music.util.query_key import normalize
+from notorious_discord_bot.cogs.music.util.track_info import TrackInfo
+from notorious_discord_bot.cogs.music.util.ytdl_pool import ExtractionError, ExtractionPool
 
-# Suppress noise about console usage from errors
-youtube_dl.utils.bug_reports_message = lambda: ''
+
+INFO_CACHE_SIZE = int(os.getenv("INFO_CACHE_SIZE", 1024))
+INFO_CACHE_TTL = float(os.getenv("INFO_CACHE_TTL", 6 * 60 * 60))
+OPUS_PASSTHROUGH = os.getenv("OPUS_PASSTHROUGH", "true").lower() in ("1", "true")
+
+
+def add_filter(options: str, audio_filter: str) -> str:
+    """Appends an audio filter to FFmpeg output options, joining any -af chain already there."""
+    args = shlex.split(options)
+    if '-af' in args:
+        i = args.index('-af') + 1
+        args[i] = f'{args[i]},{audio_filter}'
+    else:
+        args += ['-af', audio_filter]
+
+    return shlex.join(args)
 
 
 class VoiceError(Exception):
@@ -30,6 +54,7 @@ class YTDLSource(discord.PCMVolumeTransformer):
         'quiet': True,
         'no_warnings': True,
         'default_search': 'auto',
+        'playlistend': 1, # only the first entry of a playlist link is ever played
         'source_address': '0.0.0.0' # bind to ipv4 since ipv6 addresses cause issues sometimes
     }
 
@@ -38,73 +63,195 @@ class YTDLSource(discord.PCMVolumeTransformer):
         'options': '-vn -af bass=g=1'
     }
 
-    ytdl = youtube_dl.YoutubeDL(ytdl_format_options)
+    # youtube_dl runs in worker processes so slow lookups can't hold up the event loop or voice
+    pool = ExtractionPool(ytdl_format_options)
+    infos = InfoCache(max_size=INFO_CACHE_SIZE, ttl=INFO_CACHE_TTL)
+    # The pool already times out slow extractions, so lookups don't need a timeout of their own
+    lookups = SingleFlight()
 
 
-    def __init__(self, ctx: commands.Context, source: discord.FFmpegPCMAudio, data: dict, volume=0.5):
-        super().__init__(source, volume)
+    def __init__(self, source: discord.AudioSource, info: TrackInfo, volume=0.5):
+        self._buffer: deque[bytes] | None = None
+        self._lock = threading.Lock()
+        self._frames = 0
+        self._audio_filter: AudioFilter | None = None
 
-        self.requester = ctx.author
-        self.channel = ctx.channel
-        self.data = data
+        # Opus sources go straight to the voice client, the volume is already baked in by FFmpeg
+        self.passthrough = source if source.is_opus() else None
+        if self.passthrough:
+            self.original = None
+            self._volume = volume
+        else:
+            super().__init__(source, volume)
 
-        self.uploader = data.get('uploader')
-        self.uploader_url = data.get('uploader_url')
-        date = data.get('upload_date')
-        self.upload_date = date[6:8] + '.' + date[4:6] + '.' + date[0:4]
-        self.title = data.get('title')
-        self.thumbnail = data.get('thumbnail')
-        self.description = data.get('description')
-        self.duration = self.parse_duration(int(data.get('duration')))
-        self.tags = data.get('tags')
-        self.url = data.get('webpage_url')
-        self.views = data.get('view_count')
-        self.likes = data.get('like_count')
-        self.dislikes = data.get('dislike_count')
-        self.stream_url = data.get('url')
+        self.info = info
 
     def __str__(self):
-        return f'**{self.title}** by **{self.uploader}**'
+        return str(self.info)
+
+    @property
+    def volume(self) -> float:
+        return self._volume
+
+    @volume.setter
+    def volume(self, value: float):
+        value = max(value, 0.0)
+        if self.passthrough and value != self._volume:
+            self._switch_to_pcm()
+        self._volume = value
+
+    @property
+    def audio_filter(self) -> AudioFilter | None:
+        return self._audio_filter
+
+    @audio_filter.setter
+    def audio_filter(self, value: AudioFilter | None):
+        self._audio_filter = value
+        if value and not value.flat and self.passthrough:
+            self._switch_to_pcm()
+
+    def is_opus(self) -> bool:
+        return self.passthrough is not None
+
+    def read(self) -> bytes:
+        with self._lock:
+            source = self.passthrough or self.original
+            data = self._buffer.popleft() if self._buffer else None
+
+        if data is None:
+            data = source.read()
+
+        if source is not (self.passthrough or self.original):
+            # Switched to PCM in the middle of this read, carry on from the new source
+            return self.read()
+
+        if not data:
+            return data
+
+        self._frames += 1
+        if source is self.passthrough:
+            return data
+        if self._audio_filter:
+            return self._audio_filter.process(data, self._volume)
+        return audioop.mul(data, 2, min(self._volume, 2.0))
+
+    def preload(self, frames: int):
+        """Reads the first frames ahead of playback so it can start without waiting on FFmpeg. Blocks."""
+        with self._lock:
+            if self._buffer is not None:
+                return
+
+            source = self.passthrough or self.original
+            self._buffer = deque()
+            for _ in range(frames):
+                data = source.read()
+                if not data:
+                    break
+                self._buffer.append(data)
+
+    def cleanup(self):
+        for source in (self.passthrough, self.original):
+            if source:
+                source.cleanup()
+
+    def _switch_to_pcm(self):
+        """Replaces Opus passthrough with the PCM volume transform, picking up where playback is."""
+        with self._lock:
+            position = self._frames * discord.opus.Encoder.FRAME_LENGTH / 1000
+            self.original = self.open_audio(self.info, position=position, opus=False)
+            self.passthrough.cleanup()
+            self.passthrough = None
+            # Preloaded frames are Opus packets the PCM path can't use
+            self._buffer = None
+
+    def restart(self) -> 'YTDLSource':
+        """A new source for the same song, played from the start."""
+        return self.open(self.info, volume=self.volume)
+
+    @classmethod
+    def open(cls, info: TrackInfo, *, volume: float = 0.5) -> 'YTDLSource':
+        """Starts FFmpeg for a track, left until it's about to play so queued songs don't hold a process each."""
+        return cls(cls.open_audio(info, volume=volume), info, volume=volume)
+
+    @classmethod
+    @metrics.timed("ytdl_resolve_seconds")
+    async def resolve(cls, search: str) -> TrackInfo:
+        # Everyone asking for the same song at once shares a single extraction
+        return await cls.lookups.do(normalize(search), lambda: cls.lookup(search))
+
+    @classmethod
+    async def refresh(cls, info: TrackInfo) -> TrackInfo:
+        """The same track with a working stream URL, extracted again only if the one it has is about to expire."""
+        if info.expires is None or info.expires - EXPIRY_MARGIN > time.time():
+            return info
+
+        return await cls.resolve(info.uri)
+
+    @classmethod
+    async def lookup(cls, search: str) -> TrackInfo:
+        info, fresh = cls.infos.get(search)
+
+        if info is None:
+            info = TrackInfo.from_info(await cls.extract(search))
+        elif not fresh:
+            # youtube_dl can only get a new stream URL by extracting the page again, so this is a full
+            # extraction, but of the known page, skipping the search that first led to it
+            info = TrackInfo.from_info(await cls.extract(info.uri))
+
+        cls.infos.put(search, info)
+        return info
 
     @classmethod
-    async def create_source(cls, ctx: commands.Context, search: str, *, loop: asyncio.BaseEventLoop = None):
-        loop = loop or asyncio.get_event_loop()
+    def open_audio(cls, info: TrackInfo, *, volume: float = 0.5, position: float = 0.0, opus: bool = OPUS_PASSTHROUGH) -> discord.AudioSource:
+        """Opens the song from the audio cache when it's there, otherwise streams it and caches it for next time.
+
+        With opus, FFmpeg applies the volume and encodes the Opus itself so frames skip the PCM transform.
+        """
+        source, before_options, options = info.source, cls.ffmpeg_options['before_options'], cls.ffmpeg_options['options']
+        is_opus = info.codec == 'opus'
+
+        if audio_cache:
+            track_id = f"{info.kind}:{info.id}"
+
+            if path := audio_cache.lookup(track_id, options):
+                # The cached file already has the filters applied
+                source, before_options, options = str(path), '', '-vn'
+                # The cache always transcodes to Ogg Opus
+                is_opus = True
+            elif not info.is_stream and 0 < info.duration / 1000 <= AUDIO_CACHE_MAX_DURATION:
+                audio_cache.fill(track_id, options, source, before_options=before_options)
+
+        if position and not info.is_stream:
+            before_options = f'-ss {position:.2f} {before_options}'
 
-        partial = functools.partial(cls.ytdl.extract_info, search, download=False, process=False)
-        data = await loop.run_in_executor(None, partial)
+        if not opus:
+            return discord.FFmpegPCMAudio(source, before_options=before_options, options=options)
+
+        if is_opus and volume == 1.0 and options == '-vn':
+            # Opus audio at full volume with nothing to filter is only remuxed, py-cord copies the stream for codec='opus'
+            return discord.FFmpegOpusAudio(source, before_options=before_options, options=options, codec='opus')
+
+        return discord.FFmpegOpusAudio(source, before_options=before_options, options=add_filter(options, f'volume={volume}'))
+
+    @classmethod
+    async def extract(cls, search: str) -> dict:
+        """Resolves and processes a search or URL in a single extraction pass."""
+        try:
+            data = await cls.pool.extract(search)
+        except ExtractionError as e:
+            raise YTDLError(str(e))
 
         if data is None:
             raise YTDLError(f"Couldn't find anything that matches `{search}`")
 
         if 'entries' not in data:
-            process_info = data
-        else:
-            process_info = None
-            for entry in data['entries']:
-                if entry:
-                    process_info = entry
-                    break
-
-            if process_info is None:
-                raise YTDLError(f"Couldn't find anything that matches {search}")
+            return data
 
-        webpage_url = process_info['webpage_url']
-        partial = functools.partial(cls.ytdl.extract_info, webpage_url, download=False)
-        processed_info = await loop.run_in_executor(None, partial)
+        for entry in data['entries']:
+            if entry:
+                return entry
 
-        if processed_info is None:
-            raise YTDLError(f"Couldn't fetch `{webpage_url}`")
-
-        if 'entries' not in processed_info:
-            info = processed_info
-        else:
-            info = None
-            while info is None:
-                try:
-                    info =  processed_info['entries'].pop(0)
-                except IndexError:
-                    raise YTDLError(f"Couldn't retrieve any matches for `{webpage_url}`")
-        return cls(ctx, discord.FFmpegPCMAudio(info['url'], **cls.ffmpeg_options), data=info)
+        raise YTDLError(f"Couldn't retrieve any matches for `{search}`")
 
     @staticmethod
     def parse_duration(duration: int):
@@ -0,0 +1,112 @@
+import time
+from collections import Counter
+
+import discord
+
+from discord.ext import commands, tasks
+from loguru import logger
+
+from notorious_discord_bot.cogs.music.util.metrics import metrics
+
+
+class ShardMetrics(commands.Cog):
+    """Keeps gateway latency, connection state and event counters for each shard."""
+
+    required_intents = discord.Intents.none()
+
+    def __init__(self, bot: commands.Bot, interval: float = 60.0):
+        self.bot = bot
+
+        # Raw gateway events don't say which shard they came in on, so these are counted for the whole process
+        self.events: Counter[str] = Counter()
+        # Events the bot acts on are attributed to the shard of the guild they came from
+        self.shard_events: Counter[int] = Counter()
+        self.shard_states: dict[int, str] = {}
+        self.reconnects: Counter[int] = Counter()
+
+        self._last_report = time.monotonic()
+        self._last_counts: Counter[int] = Counter()
+
+        metrics.gauge("gateway_events", lambda: dict(self.events), "Raw gateway events received, by type", label="event")
+        metrics.gauge("shard_events", lambda: dict(self.shard_events), "Events the bot acted on, by shard", label="shard")
+        metrics.gauge("shard_latency_seconds", self.latencies, "Gateway heartbeat latency, by shard", label="shard")
+        metrics.gauge("shard_reconnects", lambda: dict(self.reconnects), "Gateway sessions resumed, by shard", label="shard")
+
+        self.report.change_interval(seconds=interval)
+        self.report.start()
+
+    def cog_unload(self):
+        self.report.cancel()
+
+    def latencies(self) -> dict[int, float]:
+        if isinstance(self.bot, commands.AutoShardedBot):
+            return dict(self.bot.latencies)
+        return {0: self.bot.latency}
+
+    def snapshot(self) -> dict[int, dict]:
+        elapsed = max(time.monotonic() - self._last_report, 1e-9)
+        return {
+            shard_id: {
+                "latency": latency,
+                "state": self.shard_states.get(shard_id, "unknown"),
+                "events": self.shard_events[shard_id],
+                "events_per_second": (self.shard_events[shard_id] - self._last_counts[shard_id]) / elapsed,
+                "reconnects": self.reconnects[shard_id],
+            }
+            for shard_id, latency in self.latencies().items()
+        }
+
+    @tasks.loop(seconds=60)
+    async def report(self):
+        for shard_id, stats in self.snapshot().items():
+            logger.info(
+                f"Shard {shard_id}: {stats['state']}, latency {stats['latency'] * 1000:.0f}ms, "
+                f"{stats['events_per_second']:.1f} events/s, {stats['reconnects']} reconnects"
+            )
+
+        self._last_report = time.monotonic()
+        self._last_counts = self.shard_events.copy()
+
+    @report.before_loop
+    async def before_report(self):
+        await self.bot.wait_until_ready()
+
+    def _count(self, guild: discord.Guild | None):
+        self.shard_events[guild.shard_id if guild else 0] += 1
+
+    @commands.Cog.listener()
+    async def on_socket_event_type(self, event_type: str):
+        self.events[event_type] += 1
+
+    @commands.Cog.listener()
+    async def on_interaction(self, interaction: discord.Interaction):
+        self._count(interaction.guild)
+
+    @commands.Cog.listener()
+    async def on_message(self, message: discord.Message):
+        self._count(message.guild)
+
+    @commands.Cog.listener()
+    async def on_voice_state_update(self, member: discord.Member, before: discord.VoiceState, after: discord.VoiceState):
+        self._count(member.guild)
+
+    @commands.Cog.listener()
+    async def on_shard_connect(self, shard_id: int):
+        self.shard_states[shard_id] = "connected"
+
+    @commands.Cog.listener()
+    async def on_shard_ready(self, shard_id: int):
+        self.shard_states[shard_id] = "ready"
+
+    @commands.Cog.listener()
+    async def on_shard_resumed(self, shard_id: int):
+        self.shard_states[shard_id] = "ready"
+        self.reconnects[shard_id] += 1
+
+    @commands.Cog.listener()
+    async def on_shard_disconnect(self, shard_id: int):
+        self.shard_states[shard_id] = "disconnected"
+
+
+def setup(bot: commands.Bot):
+    bot.add_cog(ShardMetrics(bot))
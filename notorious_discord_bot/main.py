@@ -1,4 +1,8 @@
+import importlib
+import multiprocessing
 import os
+import time
+from types import ModuleType
 
 import discord
 
@@ -6,25 +10,121 @@ from discord.ext import commands
 from dotenv import load_dotenv
 from loguru import logger
 
-from notorious_discord_bot.cogs.music.music import Music
+from notorious_discord_bot.cogs.music.util.loop_watchdog import LOOP_WATCHDOG, watchdog
+from notorious_discord_bot.cogs.music.util.metrics import METRICS_PORT, metrics
+
+STARTED = time.perf_counter()
 
 load_dotenv()
 
-intents = discord.Intents.default()
-intents.typing = True
-intents.message_content = True
-intents.presences = True
+# Modules with a setup(bot) entry point, only the ones listed here are ever imported
+EXTENSIONS = [
+    name.strip() for name in os.getenv(
+        "EXTENSIONS", "notorious_discord_bot.cogs.music.music,notorious_discord_bot.cogs.shards.shard_metrics"
+    ).split(",") if name.strip()
+]
+
+SHARD_COUNT = int(os.getenv("SHARD_COUNT")) if os.getenv("SHARD_COUNT") else None
+SHARD_PROCESSES = int(os.getenv("SHARD_PROCESSES", 1))
+SHARDED = SHARD_COUNT is not None or os.getenv("SHARDED", "").lower() in ("1", "true")
+
+
+def required_intents(cogs) -> discord.Intents:
+    """Only subscribes to the gateway events the loaded cogs say they need."""
+    # The bot's own prefix commands and help still need to read messages
+    intents = discord.Intents(guilds=True, guild_messages=True, message_content=True)
+    for cog in cogs:
+        intents |= cog.required_intents
+
+    return intents
+
+
+def import_extensions(names: list[str]) -> list[ModuleType]:
+    modules = []
+    for name in names:
+        start = time.perf_counter()
+        modules.append(importlib.import_module(name))
+        logger.info(f"Imported {name} in {time.perf_counter() - start:.2f}s")
+
+    return modules
+
+
+def extension_cogs(module: ModuleType) -> list[type[commands.Cog]]:
+    return [
+        value for value in vars(module).values()
+        if isinstance(value, type) and issubclass(value, commands.Cog) and value.__module__ == module.__name__
+    ]
+
 
-bot = commands.Bot(
+def create_bot(shard_ids: list[int] | None = None, metrics_port: int | None = METRICS_PORT) -> commands.Bot:
+    # The intents have to be known before the bot exists, so the extensions are imported first and set up after
+    extensions = import_extensions(EXTENSIONS)
+
+    options = dict(
         command_prefix=commands.when_mentioned_or("!"), 
-        intents=intents, 
+        intents=required_intents(cog for module in extensions for cog in extension_cogs(module)), 
         description="A bot to play music with, as well as some other stuff. Run !help to see what all I can do."
-)
+    )
+
+    if SHARDED:
+        bot = commands.AutoShardedBot(shard_ids=shard_ids, shard_count=SHARD_COUNT, **options)
+    else:
+        bot = commands.Bot(**options)
+
+    ready = False
+
+    @bot.event
+    async def on_ready():
+        nonlocal ready
+        logger.info(f"Logged on as {bot.user}")
+        if not ready:
+            ready = True
+            logger.info(f"Ready {time.perf_counter() - STARTED:.2f}s after starting")
+        if metrics_port:
+            await metrics.serve(metrics_port)
+        if LOOP_WATCHDOG:
+            watchdog.start()
+
+    for module in extensions:
+        module.setup(bot)
+
+    return bot
+
+
+def run(shard_ids: list[int] | None = None, metrics_port: int | None = METRICS_PORT):
+    bot = create_bot(shard_ids, metrics_port)
+    bot.run(os.getenv("DISCORD_TOKEN"))
+
+
+def shard_groups(shard_count: int, processes: int) -> list[list[int]]:
+    """Splits the shards into contiguous groups, one per process."""
+    size, extra = divmod(shard_count, processes)
+    groups, start = [], 0
+    for i in range(processes):
+        end = start + size + (1 if i < extra else 0)
+        groups.append(list(range(start, end)))
+        start = end
+
+    return [group for group in groups if group]
 
-@bot.event
-async def on_ready():
-    logger.info(f"Logged on as {bot.user}")
 
+if __name__ == "__main__":
+    if SHARD_PROCESSES > 1:
+        if SHARD_COUNT is None:
+            raise SystemExit("SHARD_COUNT has to be set to split shards across processes")
 
-bot.add_cog(Music(bot))
-bot.run(os.getenv("DISCORD_TOKEN"))
+        # Each process serves its own metrics, on consecutive ports
+        processes = [
+            multiprocessing.Process(
+                target=run,
+                args=(group, METRICS_PORT + i if METRICS_PORT else None),
+                name=f"shards-{group[0]}-{group[-1]}",
+            )
+            for i, group in enumerate(shard_groups(SHARD_COUNT, SHARD_PROCESSES))
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+    else:
+        run()